@@ -3,17 +3,31 @@ import requests
 import secrets
 import uuid
 import json
+import hmac
+import hashlib
+import base64
+import pickle
+import queue
 import smtplib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import wraps
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 
 from flask import (
     Flask, render_template, request, redirect, url_for,
-    session, flash, jsonify, abort
+    session, flash, jsonify, abort, g, make_response
 )
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import desc
+from sqlalchemy import desc, event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import object_session
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -39,15 +53,165 @@ app.config["SESSION_COOKIE_HTTPONLY"] = True
 # ============ 성능 최적화 ============
 from flask_compress import Compress
 from flask_caching import Cache
+from flask_caching.backends.base import BaseCache
 
 # Gzip 압축 (응답 크기 50% 감소)
 Compress(app)
 
-# 캐싱 설정
-cache = Cache(app, config={
-    'CACHE_TYPE': 'simple',
-    'CACHE_DEFAULT_TIMEOUT': 300  # 5분
-})
+class SQLiteCache(BaseCache):
+    """단일 서버용 공유 캐시: 같은 호스트의 모든 gunicorn 워커가 SQLite 파일 하나를 공유.
+    정수 값은 그대로 저장해 inc()를 UPSERT 한 번으로 원자적으로 처리하고, 나머지는 pickle"""
+
+    def __init__(self, path, default_timeout=300):
+        super().__init__(default_timeout)
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL NOT NULL)"
+        )
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        return cls(config.get("CACHE_SQLITE_PATH") or "/tmp/moneying-cache.sqlite3", **kwargs)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _expires(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout > 0 else 0
+
+    @staticmethod
+    def _dump(value):
+        if type(value) is int:
+            return value
+        return sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    @staticmethod
+    def _load(value):
+        return value if isinstance(value, int) else pickle.loads(value)
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires = 0 OR expires > ?)", (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return self._load(row[0])
+        except Exception:
+            return None
+
+    def has(self, key):
+        return self._conn().execute(
+            "SELECT 1 FROM cache WHERE key = ? AND (expires = 0 OR expires > ?)", (key, time.time())
+        ).fetchone() is not None
+
+    def set(self, key, value, timeout=None):
+        conn = self._conn()
+        conn.execute("REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                     (key, self._dump(value), self._expires(timeout)))
+        if secrets.randbelow(200) == 0:
+            conn.execute("DELETE FROM cache WHERE expires != 0 AND expires <= ?", (time.time(),))
+        return True
+
+    def add(self, key, value, timeout=None):
+        cur = self._conn().execute(
+            "INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires "
+            "WHERE cache.expires != 0 AND cache.expires <= ?",
+            (key, self._dump(value), self._expires(timeout), time.time()),
+        )
+        return cur.rowcount == 1
+
+    def inc(self, key, delta=1):
+        now = time.time()
+        row = self._conn().execute(
+            "INSERT INTO cache (key, value, expires) VALUES (?, ?, 0) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "value = CASE WHEN (cache.expires = 0 OR cache.expires > ?) AND typeof(cache.value) = 'integer' "
+            "THEN cache.value + excluded.value ELSE excluded.value END, "
+            "expires = CASE WHEN cache.expires = 0 OR cache.expires > ? THEN cache.expires ELSE 0 END "
+            "RETURNING value",
+            (key, delta, now, now),
+        ).fetchone()
+        return row[0] if row else None
+
+    def dec(self, key, delta=1):
+        return self.inc(key, -delta)
+
+    def delete(self, key):
+        return self._conn().execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount > 0
+
+    def delete_many(self, *keys):
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            self._conn().execute(f"DELETE FROM cache WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+        return list(keys)
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache")
+        return True
+
+
+# 캐싱 설정 (CACHE_BACKEND: simple | redis | filesystem | sqlite)
+# 여러 gunicorn 워커가 페이지 캐시/레이트 리밋을 공유하려면 simple(프로세스별) 말고 공유 백엔드 사용
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "redis" if os.getenv("REDIS_URL") else "simple").lower()
+_cache_config = {
+    'CACHE_TYPE': 'SimpleCache',
+    'CACHE_DEFAULT_TIMEOUT': 300,  # 5분
+    'CACHE_KEY_PREFIX': 'moneying:',
+    'CACHE_IGNORE_ERRORS': True,  # delete_many가 없는 키에서 멈추지 않도록
+}
+if CACHE_BACKEND == "redis":
+    _cache_config.update(CACHE_TYPE='RedisCache', CACHE_REDIS_URL=os.getenv("CACHE_REDIS_URL") or os.getenv("REDIS_URL"))
+elif CACHE_BACKEND == "filesystem":
+    _cache_config.update(CACHE_TYPE='FileSystemCache', CACHE_DIR=os.getenv("CACHE_DIR", "/tmp/moneying-cache"),
+                         CACHE_THRESHOLD=int(os.getenv("CACHE_THRESHOLD", 10000)))
+elif CACHE_BACKEND == "sqlite":
+    _cache_config.update(CACHE_TYPE=f"{__name__}.SQLiteCache", CACHE_SQLITE_PATH=os.getenv("CACHE_SQLITE_PATH"))
+elif CACHE_BACKEND != "simple":
+    print(f"[CACHE] 알 수 없는 CACHE_BACKEND={CACHE_BACKEND}, simple 사용")
+    CACHE_BACKEND = "simple"
+
+try:
+    cache = Cache(app, config=_cache_config)
+except Exception as e:
+    print(f"[CACHE] {CACHE_BACKEND} 백엔드 사용 불가, simple로 대체: {e}")
+    CACHE_BACKEND = "simple"
+    cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 300, 'CACHE_IGNORE_ERRORS': True})
+print(f"=== CACHE BACKEND: {CACHE_BACKEND} ===")
+
+# 태그 버전(tagver:*)이 모든 워커에 공유되는 백엔드에서만 태그 무효화를 믿고 긴 TTL 사용.
+# simple/filesystem은 커밋한 워커만 버전이 올라가므로 다른 워커는 TTL 동안 오래된 페이지를 줌
+CACHE_SHARED = CACHE_BACKEND in ("redis", "sqlite")
+
+
+def tagged_ttl(long_timeout, short_timeout):
+    """태그 무효화가 걸린 캐시의 TTL: 공유 백엔드면 long, 아니면 기존의 짧은 TTL"""
+    return long_timeout if CACHE_SHARED else short_timeout
+
+
+_cache_incr_lock = threading.Lock()
+
+
+def cache_incr(key, timeout):
+    """공유 캐시 카운터 +1 -> 증가 후 값.
+    redis/sqlite: add+inc로 워커 간 원자적, 첫 증가부터 timeout초 뒤 만료 (고정 윈도).
+    simple/filesystem: inc가 get+set이라 프로세스 안에서 락으로 직렬화, 증가할 때마다 만료 연장"""
+    if CACHE_BACKEND in ("redis", "sqlite"):
+        cache.add(key, 0, timeout=timeout)
+        return cache.cache.inc(key) or 0
+    with _cache_incr_lock:
+        value = (cache.get(key) or 0) + 1
+        cache.set(key, value, timeout=timeout)
+        return value
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 print(f"=== RAW DATABASE_URL: {DATABASE_URL} ===")
@@ -65,6 +229,69 @@ MAIL_USERNAME = os.getenv("MAIL_USERNAME", "")
 MAIL_PASSWORD = os.getenv("MAIL_PASSWORD", "")
 MAIL_FROM = os.getenv("MAIL_FROM", "noreply@moneying.co.kr")
 
+# 메시지 아웃박스 (이메일/알림톡 비동기 발송)
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "1") == "1"
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", 4))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 2))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5))
+OUTBOX_LOCK_SECONDS = int(os.getenv("OUTBOX_LOCK_SECONDS", 120))
+OUTBOX_EMAIL_BATCH = int(os.getenv("OUTBOX_EMAIL_BATCH", 20))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", 30))  # 완료 행 보존 기간
+OUTBOX_PURGE_INTERVAL = int(os.getenv("OUTBOX_PURGE_INTERVAL", 3600))
+
+# gunicorn gthread 워커당 스레드 수 (Procfile --threads와 같은 값). 오래 열리는 연결 상한의 기준
+WEB_THREADS = int(os.getenv("WEB_THREADS", 32))
+
+# 프로핏가드 데스크톱 서명 토큰
+PG_TOKEN_SECRET = os.getenv("PG_TOKEN_SECRET") or app.config["SECRET_KEY"]
+PG_TOKEN_TTL = int(os.getenv("PG_TOKEN_TTL", 7 * 86400))
+PG_REVOCATION_REFRESH = int(os.getenv("PG_REVOCATION_REFRESH", 30))
+PG_HEARTBEAT_MAX_AGE = int(os.getenv("PG_HEARTBEAT_MAX_AGE", 600))
+
+# 프로핏가드 선착순 무료체험 이벤트
+PG_EVENT_SLOTS = int(os.getenv("PG_EVENT_SLOTS", 100))
+# SSE 연결은 스트림 동안 워커 스레드를 점유 -> 프로세스당 동시 스트림 상한 (WEB_THREADS의 1/4, 넘으면 503 후 백오프 재연결)
+PG_EVENT_STREAM_SECONDS = int(os.getenv("PG_EVENT_STREAM_SECONDS", 120))
+PG_EVENT_MAX_STREAMS = int(os.getenv("PG_EVENT_MAX_STREAMS", max(1, WEB_THREADS // 4)))
+
+# 알림 실시간 전달 (REDIS_URL 설정 시 워커 간 Redis pub/sub, 없으면 프로세스 내부)
+REDIS_URL = os.getenv("REDIS_URL", "")
+# SSE 스트림/롱폴링은 연결 동안 gthread 워커 스레드를 점유 -> 프로세스당 동시 대기 수 상한 (WEB_THREADS의 절반)
+NOTIFY_STREAM_SECONDS = int(os.getenv("NOTIFY_STREAM_SECONDS", 300))
+NOTIFY_LONGPOLL_SECONDS = int(os.getenv("NOTIFY_LONGPOLL_SECONDS", 25))
+NOTIFY_MAX_WAITERS = int(os.getenv("NOTIFY_MAX_WAITERS", max(1, WEB_THREADS // 2)))
+
+# 커뮤니티 인기글 (최근 N일 좋아요 순, 부족하면 전체 기간에서 채움)
+COMMUNITY_POPULAR_SIZE = 3
+COMMUNITY_POPULAR_DAYS = int(os.getenv("COMMUNITY_POPULAR_DAYS", 7))
+
+# 검색 결과 수는 이 개수까지만 셈 (페이지 수 계산용, 넘으면 "N+건")
+COMMUNITY_SEARCH_COUNT_CAP = int(os.getenv("COMMUNITY_SEARCH_COUNT_CAP", 1000))
+
+# 게시글 상세에서 처음 렌더링하는 댓글 수 / "더보기" 1회당 불러오는 댓글 수
+COMMUNITY_COMMENTS_PAGE = int(os.getenv("COMMUNITY_COMMENTS_PAGE", 30))
+
+# 비로그인용 댓글 첫 페이지 HTML 조각 캐시 (초, 댓글 작성/수정/삭제 시 즉시 무효화)
+COMMUNITY_COMMENTS_CACHE_TTL = int(os.getenv("COMMUNITY_COMMENTS_CACHE_TTL", 300))
+
+# 비로그인 페이지 캐시의 CDN s-maxage 상한 (초, 서버 캐시는 태그로 무효화되지만 CDN은 만료까지 유지)
+PAGE_CDN_MAX_AGE = int(os.getenv("PAGE_CDN_MAX_AGE", 60))
+
+# 닉네임 캐시 (프로세스 내 LRU, 다른 워커의 닉네임 변경은 TTL 안에 반영)
+NICKNAME_CACHE_SIZE = int(os.getenv("NICKNAME_CACHE_SIZE", 5000))
+NICKNAME_CACHE_TTL = int(os.getenv("NICKNAME_CACHE_TTL", 300))
+
+# 비밀번호 해시 (전용 스레드 풀로 동시 실행 수 제한)
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", 16))
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+
+# SMTP 연결 풀
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 2))
+SMTP_IDLE_TIMEOUT = int(os.getenv("SMTP_IDLE_TIMEOUT", 60))
+
 # ============ [FIX #5,6,7] API 키/비밀번호 환경변수로 통합 ============
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
 ADMIN_EMAIL = os.getenv("ADMIN_EMAIL")
@@ -105,6 +332,10 @@ ALIGO_TPL_PAYMENT = os.getenv("ALIGO_TPL_PAYMENT", "")
 ALIGO_TPL_PAYMENT_FAIL = os.getenv("ALIGO_TPL_PAYMENT_FAIL", "")
 ALIGO_TPL_TRIAL = os.getenv("ALIGO_TPL_TRIAL", "")
 
+# 대량 발송: 요청당 수신자 수 (알리고 최대 500), 초당 API 호출 수
+ALIGO_BULK_SIZE = max(1, min(500, int(os.getenv("ALIGO_BULK_SIZE", 500))))
+ALIGO_RATE_PER_SEC = float(os.getenv("ALIGO_RATE_PER_SEC", 5))
+
 
 
 import boto3
@@ -210,12 +441,71 @@ def add_header(response):
     # 정적 파일 캐싱 (CSS, JS, 이미지)
     if request.path.startswith('/static/'):
         response.headers["Cache-Control"] = "public, max-age=3600"  # 1시간
+    elif g.get("page_cache_headers"):
+        pass  # anonymous_page_cache가 Cache-Control/ETag를 직접 설정
     elif 'text/html' in response.content_type:
         response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
         response.headers["Pragma"] = "no-cache"
         response.headers["Expires"] = "0"
     return response
 
+
+def _etag_matches(etag):
+    """If-None-Match 비교. Flask-Compress가 붙이는 ":gzip" 같은 접미사는 무시"""
+    tags = request.if_none_match
+    if not tags:
+        return False
+    return tags.star_tag or any(t.split(":")[0] == etag for t in tags.as_set(include_weak=True))
+
+
+def anonymous_page_cache(timeout=60, tags=()):
+    """비로그인 방문자 페이지 캐시 (키: path+query+태그 버전) + ETag/Last-Modified 조건부 GET.
+    세션 쿠키가 없으면 public, s-maxage로 CDN 캐시 허용(태그 무효화가 닿지 않으므로 PAGE_CDN_MAX_AGE 이하),
+    있으면 브라우저 재검증만(private).
+    로그인/관리자/flash 대기 요청은 캐시 없이 렌더링되고 기존 no-store 헤더 유지"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if (request.method != "GET" or session.get("user_id") or session.get("admin")
+                    or session.get("_flashes")):
+                return f(*args, **kwargs)
+
+            key = "page:" + request.full_path
+            if tags:
+                key += "#" + cache_tag_versions([t.format(**kwargs) for t in tags])
+            entry = cache.get(key)
+            if entry is None:
+                resp = make_response(f(*args, **kwargs))
+                if resp.status_code != 200 or resp.mimetype != "text/html" or session.modified:
+                    return resp
+                body = resp.get_data()
+                entry = {
+                    "body": body,
+                    "content_type": resp.content_type,
+                    "etag": hashlib.sha1(body).hexdigest()[:32],
+                    "modified": datetime.utcnow().replace(microsecond=0),
+                }
+                cache.set(key, entry, timeout=timeout)
+
+            from flask import Response
+            if _etag_matches(entry["etag"]) or (
+                    not request.if_none_match and request.if_modified_since
+                    and request.if_modified_since.replace(tzinfo=None) >= entry["modified"]):
+                resp = Response(status=304)
+            else:
+                resp = Response(entry["body"], content_type=entry["content_type"])
+            resp.set_etag(entry["etag"])
+            resp.last_modified = entry["modified"]
+            if app.config["SESSION_COOKIE_NAME"] in request.cookies:
+                resp.headers["Cache-Control"] = "private, no-cache"
+            else:
+                resp.headers["Cache-Control"] = f"public, max-age=0, s-maxage={min(timeout, PAGE_CDN_MAX_AGE)}"
+            resp.headers["Vary"] = "Cookie"
+            g.page_cache_headers = True
+            return resp
+        return wrapper
+    return decorator
+
     
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "static", "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -224,25 +514,280 @@ app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 ALLOWED_EXT = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
 
 
+# ============ 비밀번호 해시 ============
+# scrypt 해시는 요청 스레드에서 돌리면 CPU를 오래 점유하므로 전용 풀에서 실행.
+# 동시 실행은 PASSWORD_HASH_WORKERS, 대기는 PASSWORD_HASH_QUEUE개까지. 넘치면 즉시 PasswordHashBusy
+class PasswordHashBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, workers=2, max_queue=16, timeout=10):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pwhash")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._stats_lock = threading.Lock()
+        self._queue_times = []
+        self._run_times = []
+        self.calls = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self.rejected += 1
+            raise PasswordHashBusy()
+        submitted = time.monotonic()
+
+        def task():
+            started = time.monotonic()
+            try:
+                return fn(*args)
+            finally:
+                self._record(started - submitted, time.monotonic() - started)
+                self._slots.release()
+
+        future = self._executor.submit(task)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # 아직 대기열에 있으면 취소 (task가 안 돌므로 슬롯은 여기서 반환), 실행 중이면 끝나는 대로 task가 반환
+            if future.cancel():
+                self._slots.release()
+            with self._stats_lock:
+                self.rejected += 1
+            raise PasswordHashBusy()
+
+    def _record(self, queued, ran):
+        with self._stats_lock:
+            self.calls += 1
+            self._queue_times.append(queued)
+            self._run_times.append(ran)
+            if len(self._queue_times) > 1000:
+                del self._queue_times[:500]
+                del self._run_times[:500]
+
+    def stats(self):
+        def summary(values):
+            values = sorted(values)
+            if not values:
+                return {"avg_ms": None, "p95_ms": None, "max_ms": None}
+            return {
+                "avg_ms": round(sum(values) / len(values) * 1000, 1),
+                "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1),
+            }
+        with self._stats_lock:
+            return {
+                "method": PASSWORD_HASH_METHOD,
+                "calls": self.calls,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "queue": summary(self._queue_times),
+                "run": summary(self._run_times),
+            }
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE, PASSWORD_HASH_TIMEOUT)
+
+
+def hash_password(password):
+    return password_hasher.run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(pw_hash, password):
+    if not pw_hash or not password:
+        return False
+    return password_hasher.run(check_password_hash, pw_hash, password)
+
+
+def verify_and_upgrade_password(user, password):
+    """비밀번호 확인 후, 현재 PASSWORD_HASH_METHOD가 아닌 해시면 재해시 (커밋은 호출한 쪽에서)"""
+    if not verify_password(user.pw_hash, password):
+        return False
+    if not user.pw_hash.startswith(PASSWORD_HASH_METHOD + "$"):
+        try:
+            user.pw_hash = hash_password(password)
+            with password_hasher._stats_lock:
+                password_hasher.rehashed += 1
+        except PasswordHashBusy:
+            pass  # 다음 로그인 때 재시도
+    return True
+
+
+@app.errorhandler(PasswordHashBusy)
+def password_hash_busy(e):
+    msg = "요청이 많아 처리가 지연되고 있습니다. 잠시 후 다시 시도해주세요."
+    if request.path.startswith("/api/") or request.is_json:
+        resp = jsonify({"ok": False, "result": "FAIL", "msg": msg, "error": msg})
+        resp.status_code = 503
+    else:
+        flash(msg, "error")
+        resp = redirect(request.path)
+    resp.headers["Retry-After"] = "2"
+    return resp
+
+
+def build_email_message(to_email, subject, html_body):
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = MAIL_FROM
+    msg["To"] = to_email
+    msg.attach(MIMEText(html_body, "html", "utf-8"))
+    return msg
+
+
+class SMTPPool:
+    """인증된 SMTP 연결을 재사용하는 풀 (TLS 핸드셰이크/로그인을 메시지마다 하지 않음)"""
+
+    # 연결 자체가 죽었을 때만 재접속 (수신자 거부 등은 메시지 단위 실패)
+    RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError)
+
+    def __init__(self, size=2, idle_timeout=60):
+        self.idle_timeout = idle_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._stats_lock = threading.Lock()
+        self._latencies = []
+        self.sent = 0
+        self.failed = 0
+        self.connections_opened = 0
+        self.reconnects = 0
+        self.last_batch = None
+
+    def _connect(self):
+        conn = smtplib.SMTP(MAIL_SERVER, MAIL_PORT, timeout=30)
+        conn.starttls()
+        conn.login(MAIL_USERNAME, MAIL_PASSWORD)
+        with self._stats_lock:
+            self.connections_opened += 1
+        return conn
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.quit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _checkout(self):
+        """유휴 연결 재사용 (오래 쉰 연결은 NOOP으로 확인), 없으면 None"""
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            idle = time.monotonic() - last_used
+            if idle > self.idle_timeout:
+                self._close(conn)
+                continue
+            if idle > 10:
+                try:
+                    if conn.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected("noop failed")
+                except Exception:
+                    self._close(conn)
+                    continue
+            return conn
+
+    def _record(self, ok, elapsed):
+        with self._stats_lock:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self._latencies.append(elapsed)
+            if len(self._latencies) > 1000:
+                del self._latencies[:500]
+
+    def send_batch(self, messages):
+        """[(to, subject, html)] 을 연결 하나로 순차 발송 → [(ok, error)]"""
+        results = []
+        started = time.monotonic()
+        self._slots.acquire()
+        conn = self._checkout()
+        try:
+            for to_email, subject, html_body in messages:
+                msg_started = time.monotonic()
+                raw = build_email_message(to_email, subject, html_body).as_string()
+                try:
+                    if conn is None:
+                        conn = self._connect()
+                    try:
+                        conn.sendmail(MAIL_FROM, to_email, raw)
+                    except self.RECONNECT_ERRORS:
+                        # 서버가 연결을 끊은 경우 1회 재접속 후 재시도
+                        self._close(conn)
+                        conn = None
+                        with self._stats_lock:
+                            self.reconnects += 1
+                        conn = self._connect()
+                        conn.sendmail(MAIL_FROM, to_email, raw)
+                    results.append((True, None))
+                    self._record(True, time.monotonic() - msg_started)
+                except Exception as e:
+                    if isinstance(e, self.RECONNECT_ERRORS) and conn is not None:
+                        self._close(conn)
+                        conn = None
+                    results.append((False, str(e)))
+                    self._record(False, time.monotonic() - msg_started)
+        finally:
+            if conn is not None:
+                self._idle.put((conn, time.monotonic()))
+            self._slots.release()
+
+        elapsed = time.monotonic() - started
+        ok_count = sum(1 for ok, _ in results if ok)
+        self.last_batch = {
+            "size": len(messages),
+            "sent": ok_count,
+            "elapsed_sec": round(elapsed, 3),
+            "per_sec": round(ok_count / elapsed, 2) if elapsed > 0 else None,
+        }
+        if len(messages) > 1:
+            print(f"[SMTP] 배치 발송 {ok_count}/{len(messages)}건, {elapsed:.2f}초 ({self.last_batch['per_sec']}건/s)")
+        return results
+
+    def send(self, to_email, subject, html_body):
+        ok, error = self.send_batch([(to_email, subject, html_body)])[0]
+        if not ok:
+            raise RuntimeError(error)
+
+    def stats(self):
+        with self._stats_lock:
+            lat = sorted(self._latencies)
+            return {
+                "sent": self.sent,
+                "failed": self.failed,
+                "connections_opened": self.connections_opened,
+                "reconnects": self.reconnects,
+                "idle_connections": self._idle.qsize(),
+                "avg_latency_ms": round(sum(lat) / len(lat) * 1000, 1) if lat else None,
+                "p95_latency_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000, 1) if lat else None,
+                "last_batch": self.last_batch,
+            }
+
+
+smtp_pool = SMTPPool(size=SMTP_POOL_SIZE, idle_timeout=SMTP_IDLE_TIMEOUT)
+
+
+def deliver_email(to_email, subject, html_body):
+    """SMTP 발송 (실패 시 예외 발생 - 아웃박스 워커 재시도용)"""
+    smtp_pool.send(to_email, subject, html_body)
+
+
 def send_email(to_email, subject, html_body):
-    """이메일 발송 함수"""
+    """이메일 즉시 발송 함수 (결과가 바로 필요한 경우만 사용, 그 외엔 queue_email)"""
     if not MAIL_USERNAME or not MAIL_PASSWORD:
         print(f"[EMAIL] 설정 없음 - To: {to_email}, Subject: {subject}")
         return False
-    
+
     try:
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = subject
-        msg["From"] = MAIL_FROM
-        msg["To"] = to_email
-        
-        msg.attach(MIMEText(html_body, "html", "utf-8"))
-        
-        with smtplib.SMTP(MAIL_SERVER, MAIL_PORT) as server:
-            server.starttls()
-            server.login(MAIL_USERNAME, MAIL_PASSWORD)
-            server.sendmail(MAIL_FROM, to_email, msg.as_string())
-        
+        deliver_email(to_email, subject, html_body)
         print(f"[EMAIL] 발송 성공 - To: {to_email}")
         return True
     except Exception as e:
@@ -383,6 +928,8 @@ class CommunityPost(db.Model):
     deal_subscribers_only = db.Column(db.Boolean, default=False)
     deal_closed = db.Column(db.Boolean, default=False)
     reward_requested = db.Column(db.Boolean, default=False)  # 수익인증 리워드 신청 여부
+    like_count = db.Column(db.Integer, default=0, nullable=False, index=True)  # community_like에서 원자적으로 증감
+    comment_count = db.Column(db.Integer, default=0, nullable=False)  # 댓글 insert/delete 이벤트에서 증감
 
     def images(self):
         try:
@@ -392,6 +939,12 @@ class CommunityPost(db.Model):
             return []
 
 
+class CommunityCategoryCount(db.Model):
+    """카테고리별 게시글 수 (CommunityPost insert/delete/카테고리 변경 시 같은 트랜잭션에서 갱신)"""
+    category = db.Column(db.String(30), primary_key=True)
+    post_count = db.Column(db.Integer, nullable=False, default=0)
+
+
 class CommunityComment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     post_id = db.Column(db.Integer, db.ForeignKey('community_post.id'), nullable=False)
@@ -413,6 +966,8 @@ class LinkRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False, default="")
     original_url = db.Column(db.Text, nullable=False, default="")
+    canonical_hash = db.Column(db.String(40), nullable=True, index=True)  # sha1(canonicalize_url(original_url))
+    canonical_version = db.Column(db.SmallInteger, nullable=True)  # 해시를 만든 LINK_HASH_VERSION
     coupang_url = db.Column(db.Text, nullable=True, default="")
     requester_email = db.Column(db.String(120), nullable=False, default="")
     kakao_nickname = db.Column(db.String(100), nullable=True, default="")
@@ -423,6 +978,13 @@ class LinkRequest(db.Model):
         return "완료" if (self.coupang_url or "").strip() else "대기중"
 
 
+class LinkRequestQuota(db.Model):
+    """월별 링크요청 사용량 (요청 insert와 같은 트랜잭션에서 조건부 UPDATE로 +1)"""
+    user_email = db.Column(db.String(120), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)  # "YYYY-MM" (UTC)
+    used = db.Column(db.Integer, nullable=False, default=0)
+
+
 class StoreProduct(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False, default="")
@@ -635,6 +1197,196 @@ class EventTrialApply(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+class EventSlotCounter(db.Model):
+    """선착순 이벤트 슬롯 카운터 (행 1개, 조건부 UPDATE로 원자적 선점)"""
+    key = db.Column(db.String(50), primary_key=True)
+    claimed = db.Column(db.Integer, nullable=False, default=0)
+    cap = db.Column(db.Integer, nullable=False)
+
+
+class AdminJob(db.Model):
+    """관리자 백그라운드 작업 상태 (JSON). 어느 워커로 폴링이 와도 조회되도록 DB에 저장"""
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False, default="")
+    data = db.Column(db.Text, nullable=False, default="{}")
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class PgTokenRevocation(db.Model):
+    """프로핏가드 서명 토큰 폐기 목록: not_before 이전에 발급된 토큰은 무효,
+    replan_before 이전에 발급된 토큰은 등급이 바뀌었으므로 만료로 취급(DB 재평가 후 재발급)"""
+    user_id = db.Column(db.Integer, primary_key=True)
+    not_before = db.Column(db.DateTime, nullable=False)
+    replan_before = db.Column(db.DateTime, nullable=True)
+
+
+class MessageOutbox(db.Model):
+    """이메일/알림톡 발송 대기열 (요청 트랜잭션과 함께 커밋, 워커가 발송)"""
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(20), nullable=False)  # email, alimtalk
+    payload = db.Column(db.Text, nullable=False, default="{}")
+    status = db.Column(db.String(20), default="pending", index=True)  # pending, sending, sent, skipped, dead
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=5)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    campaign_id = db.Column(db.Integer, nullable=True, index=True)  # 대량 발송 캠페인 묶음
+
+    def data(self):
+        try:
+            v = json.loads(self.payload or "{}")
+            return v if isinstance(v, dict) else {}
+        except Exception:
+            return {}
+
+
+class AlimtalkCampaign(db.Model):
+    """알림톡 대량 발송 캠페인 (수신자별 결과는 MessageOutbox.campaign_id로 추적)"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=True)
+    tpl_code = db.Column(db.String(50), nullable=False)
+    subject = db.Column(db.String(200), nullable=True)
+    total = db.Column(db.Integer, default=0)
+    rejected = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ============ 캐시 태그 무효화 ============
+# 캐시 키에 태그 버전(tagver:<tag>)을 붙이고, 모델 커밋 시 버전을 바꿔 해당 태그 캐시를 한 번에 무효화.
+# 모델 -> (태그, id 속성): 변경 시 "<태그>"와 "<태그>:<id>" 두 태그가 바뀜
+CACHE_TAG_MODELS = {
+    StoreProduct: ("store", "id"),
+    Post: ("post", "id"),
+    Category: ("category", "id"),
+    GroupBuy: ("groupbuy", "id"),
+    CommunityPost: ("community", "id"),
+    CommunityComment: ("community", "post_id"),
+}
+# 이 컬럼만 바뀐 경우는 무효화하지 않음 (조회수 등)
+CACHE_TAG_IGNORE = {
+    Post: {"view_count"},
+}
+
+
+def mark_cache_tags(*tags):
+    """ORM 객체를 거치지 않는 쓰기(query.update, Core update 등)에서 커밋 시 무효화할 태그 등록"""
+    db.session.info.setdefault("cache_tags", set()).update(tags)
+
+
+@event.listens_for(db.session, "after_flush")
+def _collect_cache_tags(sess, flush_context):
+    tags = set()
+    for obj in list(sess.new) + list(sess.dirty) + list(sess.deleted):
+        spec = CACHE_TAG_MODELS.get(type(obj))
+        if spec is None:
+            continue
+        if obj in sess.dirty and obj not in sess.deleted:
+            changed = {a.key for a in inspect(obj).attrs if a.history.has_changes()}
+            if not changed - CACHE_TAG_IGNORE.get(type(obj), set()):
+                continue
+        tag, id_attr = spec
+        tags.add(tag)
+        obj_id = getattr(obj, id_attr, None)
+        if obj_id is not None:
+            tags.add(f"{tag}:{obj_id}")
+    if tags:
+        sess.info.setdefault("cache_tags", set()).update(tags)
+
+
+@event.listens_for(db.session, "after_commit")
+def _bump_cache_tags(sess):
+    for tag in sess.info.pop("cache_tags", ()):
+        cache.set(f"tagver:{tag}", secrets.token_hex(4), timeout=0)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _drop_cache_tags(sess):
+    sess.info.pop("cache_tags", None)
+
+
+def cache_tag_versions(tags):
+    """태그들의 현재 버전 문자열 (처음 보는 태그는 버전 생성)"""
+    if not tags:
+        return ""
+    keys = [f"tagver:{t}" for t in tags]
+    versions = []
+    for key, ver in zip(keys, cache.get_many(*keys)):
+        if ver is None:
+            ver = secrets.token_hex(4)
+            if not cache.add(key, ver, timeout=0):
+                ver = cache.get(key) or ver
+        versions.append(ver)
+    return ".".join(versions)
+
+
+def tagged_cache_key(*tags, query_string=False):
+    """@cache.cached(make_cache_key=...)용 키 함수. 태그에 "{product_id}"처럼 뷰 인자를 넣을 수 있음"""
+    def make_key(*args, **kwargs):
+        key = "view:" + request.path
+        if query_string:
+            key += "?" + "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        return key + "#" + cache_tag_versions([t.format(**kwargs) for t in tags])
+    return make_key
+
+
+# ============ 카테고리 레지스트리 ============
+CATEGORY_REGISTRY_MAX_AGE = int(os.getenv("CATEGORY_REGISTRY_MAX_AGE", 300))
+CATEGORY_HIDDEN_KEYS = ("all", "bookmark", "recent")
+
+
+class CategoryRegistry:
+    """카테고리 목록 프로세스 메모리 캐시 (읽기 전용 SimpleNamespace 스냅샷).
+    "category" 태그 버전이 바뀌면 다시 읽음 -> 공유 캐시 백엔드면 다른 워커의 추가/수정/삭제도 다음 요청에 반영.
+    simple 백엔드(워커별 캐시)에서도 CATEGORY_REGISTRY_MAX_AGE초마다 다시 읽어 결국 일치"""
+
+    COLUMNS = ("id", "key", "name", "emoji", "sort_order", "is_active", "is_system")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._loaded_at = 0
+        self._items = []
+
+    def _snapshot(self):
+        version = cache_tag_versions(["category"])
+        if version != self._version or time.monotonic() - self._loaded_at > CATEGORY_REGISTRY_MAX_AGE:
+            with self._lock:
+                if version != self._version or time.monotonic() - self._loaded_at > CATEGORY_REGISTRY_MAX_AGE:
+                    rows = Category.query.order_by(Category.sort_order).all()
+                    self._items = [SimpleNamespace(**{c: getattr(r, c) for c in self.COLUMNS}) for r in rows]
+                    self._version = version
+                    self._loaded_at = time.monotonic()
+        return self._items
+
+    def all(self):
+        return list(self._snapshot())
+
+    def active(self, exclude=()):
+        return [c for c in self._snapshot() if c.is_active and c.key not in exclude]
+
+
+category_registry = CategoryRegistry()
+
+
+def get_gallery_category_counts():
+    """갤러리 칩용 카테고리별 게시글 수 (/api/gallery와 같은 노출 조건, "post" 태그로 무효화)"""
+    key = "gallery:category_counts#" + cache_tag_versions(["post"])
+    counts = cache.get(key)
+    if counts is None:
+        rows = db.session.query(Post.category, db.func.count(Post.id)).filter(
+            Post.is_deleted != True
+        ).filter(
+            (Post.status == "approved") | (Post.status == None) | (Post.status == "")
+        ).group_by(Post.category).all()
+        counts = {}
+        for category, n in rows:
+            counts[category or "all"] = counts.get(category or "all", 0) + n
+        cache.set(key, counts, timeout=tagged_ttl(3600, 60))
+    return counts
+
 
 # ----------------------------
 
@@ -648,15 +1400,75 @@ def ensure_referral_code(user):
         user.referral_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
         db.session.commit()
 
+class NicknameLRU:
+    """email -> nickname(None 포함) 크기 제한 + TTL LRU. 스레드 간 공유"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, emails):
+        """-> (찾은 {email: nickname}, 없는 email 목록)"""
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for e in emails:
+                item = self._data.get(e)
+                if item is None or item[1] < now:
+                    missing.append(e)
+                    continue
+                self._data.move_to_end(e)
+                found[e] = item[0]
+        return found, missing
+
+    def set_many(self, mapping):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for e, nick in mapping.items():
+                self._data[e] = (nick, expires)
+                self._data.move_to_end(e)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *emails):
+        with self._lock:
+            for e in emails:
+                self._data.pop(e, None)
+
+
+nickname_cache = NicknameLRU(NICKNAME_CACHE_SIZE, NICKNAME_CACHE_TTL)
+
+
+def _display_name(email, nickname):
+    return nickname or (email.split('@')[0] if email else '익명')
+
+
+def prime_nicknames(emails):
+    """요청 단위 닉네임 맵(g)에 emails를 미리 채움: LRU에 없는 것만 IN 쿼리 1번"""
+    resolved = g.setdefault("nicknames", {})
+    wanted = {e for e in emails if e and e not in resolved}
+    if not wanted:
+        return resolved
+    found, missing = nickname_cache.get_many(wanted)
+    if missing:
+        fetched = dict.fromkeys(missing)
+        try:
+            fetched.update(db.session.query(User.email, User.nickname).filter(User.email.in_(missing)).all())
+            nickname_cache.set_many(fetched)
+        except Exception as e:
+            print(f"[NICKNAME] 조회 실패: {e}")
+        found.update(fetched)
+    resolved.update(found)
+    return resolved
+
+
 def get_nickname(email):
-    """이메일로 닉네임 조회"""
-    try:
-        user = User.query.filter_by(email=email).first()
-        if user and user.nickname:
-            return user.nickname
-    except:
-        pass
-    return email.split('@')[0] if email else '익명'
+    """이메일로 닉네임 조회 (prime_nicknames로 미리 채웠으면 쿼리 없음)"""
+    if not email:
+        return '익명'
+    return _display_name(email, prime_nicknames([email]).get(email))
 
 
 @app.context_processor
@@ -664,7 +1476,7 @@ def inject_globals():
     """모든 템플릿에서 사용 가능한 전역 변수/함수"""
     unread_count = 0
     if session.get("user_id"):
-        unread_count = Notification.query.filter(Notification.user_id==session["user_id"], Notification.is_read==False, ~Notification.type.like("quest_%")).count()
+        unread_count = get_unread_count(session["user_id"])
     return dict(
         get_nickname=get_nickname,
         unread_notifications_count=unread_count
@@ -692,11 +1504,27 @@ def save_upload(file_storage):
     if ext and ext not in ALLOWED_EXT:
         return ""
     
+    try:
+        return save_image_derivatives(file_storage)
+    except ValueError as e:
+        # 해상도 초과 -> 호출한 쪽의 잘못된 파일(400) 처리로
+        print(f"[UPLOAD] 거부: {e}")
+        return ""
+
+
+IMAGE_MAX_PIXELS = 40_000_000  # 압축 해제 폭탄 방지 (약 6300x6300)
+
+
+def save_image_derivatives(fp):
+    """이미지 파일 객체 -> 원본(1600px)/썸네일(800px) WEBP를 R2에 올리고 원본 URL 반환.
+    요청 컨텍스트 없이 호출 가능 (대량 등록 워커 풀에서 사용)"""
     from io import BytesIO
     from PIL import Image
     
     # 이미지 압축
-    img = Image.open(file_storage)
+    img = Image.open(fp)
+    if img.width * img.height > IMAGE_MAX_PIXELS:
+        raise ValueError(f"이미지 해상도가 너무 큽니다 ({img.width}x{img.height})")
     if img.mode in ('RGBA', 'P'):
         img = img.convert('RGB')
     
@@ -800,17 +1628,75 @@ def get_trial_expires_at(user_id):
 # ----------------------------
 # 링크요청 제한 헬퍼
 # ----------------------------
+def _quota_month(now=None):
+    return (now or datetime.utcnow()).strftime("%Y-%m")
+
+
 def get_monthly_link_request_count(user_email):
+    """이번 달 사용량 (쿼터 행 PK 조회 1회)"""
     if not user_email:
         return 0
+    row = db.session.get(LinkRequestQuota, (user_email, _quota_month()))
+    return row.used if row else 0
+
+
+def claim_link_request_quota(user_email, limit):
+    """이번 달 쿼터 1회 선점 (커밋은 호출한 쪽 트랜잭션에서). 한도 초과면 False
+
+    used < limit 인 경우에만 +1 하는 조건부 UPDATE라 더블 서브밋이 동시에 들어와도 한도를 넘지 않음.
+    이번 달 첫 요청이면 행을 만들고, 동시에 다른 요청이 먼저 만들었으면(unique 충돌) UPDATE로 재시도
+    """
+    if not user_email or limit <= 0:
+        return False
+    month = _quota_month()
+    for _ in range(2):
+        res = db.session.execute(
+            db.update(LinkRequestQuota)
+            .where(LinkRequestQuota.user_email == user_email, LinkRequestQuota.month == month,
+                   LinkRequestQuota.used < limit)
+            .values(used=LinkRequestQuota.used + 1)
+        )
+        if res.rowcount == 1:
+            return True
+        if db.session.get(LinkRequestQuota, (user_email, month)):
+            return False
+        try:
+            with db.session.begin_nested():
+                db.session.add(LinkRequestQuota(user_email=user_email, month=month, used=1))
+            return True
+        except IntegrityError:
+            continue
+    return False
+
+
+def seed_link_request_quota():
+    """이번 달 쿼터 행이 없는 사용자는 기존 LinkRequest 수로 채움 (배포 직후 1회성 백필)"""
     now = datetime.utcnow()
+    month = _quota_month(now)
     first_day = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    return LinkRequest.query.filter(
-        LinkRequest.requester_email == user_email,
+    seeded = {e for (e,) in db.session.query(LinkRequestQuota.user_email).filter_by(month=month)}
+    rows = db.session.query(LinkRequest.requester_email, db.func.count(LinkRequest.id)).filter(
         LinkRequest.created_at >= first_day
-    ).count()
+    ).group_by(LinkRequest.requester_email).all()
+    added = 0
+    for email, cnt in rows:
+        if email and email not in seeded:
+            db.session.add(LinkRequestQuota(user_email=email, month=month, used=cnt))
+            added += 1
+    if added:
+        db.session.commit()
+        print(f"[LINK QUOTA] {month} 사용량 백필: {added}명")
+
 
 def get_link_request_limit(user_id):
+    """요금제별 월 한도 (구독 조회가 여러 번 나가므로 요청당 1회만 계산해 g에 보관)"""
+    limits = g.setdefault("link_request_limits", {})
+    if user_id not in limits:
+        limits[user_id] = _link_request_limit(user_id)
+    return limits[user_id]
+
+
+def _link_request_limit(user_id):
     if has_active_subscription(user_id, "allinone"):
         return LINK_REQUEST_LIMIT_ALLINONE
     if has_active_subscription(user_id, "gallery"):
@@ -830,6 +1716,201 @@ def can_make_link_request(user_id, user_email):
     return get_monthly_link_request_count(user_email) < get_link_request_limit(user_id)
 
 
+# ============ 링크요청 URL 정규화 / 변환 재사용 ============
+# 같은 상품 URL이라도 추적 파라미터·호스트 표기가 달라 중복 요청이 쌓이므로 정규화한 URL의 sha1로 묶음.
+# 이미 완료된 요청이 있으면 새 요청은 그 쿠팡 링크로 바로 완료 처리
+# 값이 목적지/상품 옵션을 담을 수 있는 키(redirect, ref, src, share 등)는 남기고, 순수 광고·분석 추적 키만 제거
+LINK_TRACKING_PARAMS = {
+    "fbclid", "gclid", "gbraid", "wbraid", "dclid", "msclkid", "igshid", "yclid", "ttclid", "twclid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "napm",
+}
+LINK_TRACKING_PREFIXES = ("utm_",)
+LINK_HOST_PREFIXES = ("www.", "m.", "mobile.")
+LINK_HASH_BACKFILL_CHUNK = 1000
+LINK_HASH_VERSION = 2  # canonicalize_url 규칙을 바꾸면 올림 -> 이전 버전 해시는 백그라운드에서 재계산
+# 관리자 링크요청 대기열 부분 인덱스 + 검색용 trigram 인덱스 (trigram은 PostgreSQL에서만)
+LINK_REQUEST_INDEXES = {
+    "ix_link_request_pending": "ON link_request (id) WHERE coupang_url IS NULL OR coupang_url = ''",
+}
+LINK_REQUEST_TRGM_INDEXES = {
+    f"ix_link_request_{col}_trgm": f"ON link_request USING gin ({col} gin_trgm_ops)"
+    for col in ("requester_email", "title", "original_url")
+}
+LINK_INDEX_LOCK_KEY = 4_810_048  # pg advisory lock - 인덱스 생성은 워커 1개만
+
+
+def canonicalize_url(url):
+    """스킴/호스트 소문자, www·m 접두어·기본 포트·프래그먼트·추적 파라미터 제거, 쿼리 정렬"""
+    from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+    url = (url or "").strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    host = (parts.hostname or "").lower().rstrip(".")
+    for prefix in LINK_HOST_PREFIXES:
+        if host.startswith(prefix) and host.count(".") > 1:
+            host = host[len(prefix):]
+            break
+    scheme = (parts.scheme or "https").lower()
+    if scheme == "http":
+        scheme = "https"
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in LINK_TRACKING_PARAMS and not k.lower().startswith(LINK_TRACKING_PREFIXES)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def canonical_url_hash(url):
+    return hashlib.sha1(canonicalize_url(url).encode("utf-8")).hexdigest()
+
+
+def find_fulfilled_link(canonical_hash):
+    """같은 정규화 URL로 이미 완료된 쿠팡 링크 (가장 최근 것)"""
+    if not canonical_hash:
+        return None
+    return db.session.execute(
+        db.select(LinkRequest.coupang_url)
+        .where(LinkRequest.canonical_hash == canonical_hash,
+               LinkRequest.coupang_url != None, LinkRequest.coupang_url != "")
+        .order_by(LinkRequest.id.desc()).limit(1)
+    ).scalar()
+
+
+def fulfill_link_requests(pairs):
+    """[(LinkRequest, coupang_url)]를 한 트랜잭션으로 완료 처리 -> {요청 id: 함께 완료된 대기 요청 수}
+
+    같은 정규화 URL로 대기중인 다른 요청도 함께 채우고, 요청자 알림은 한 번에 bulk insert 후 커밋 1회.
+    bulk insert는 Notification after_insert 이벤트를 타지 않으므로 커밋 후 직접 발행
+    """
+    done, by_hash = [], {}
+    for it, coupang_url in pairs:
+        it.coupang_url = coupang_url
+        if coupang_url:
+            done.append(it)
+            if it.canonical_hash:
+                by_hash.setdefault(it.canonical_hash, it)
+    siblings = {it.id: 0 for it, _ in pairs}
+    if by_hash:
+        for sibling in LinkRequest.query.filter(
+            LinkRequest.canonical_hash.in_(list(by_hash)), LinkRequest.id.notin_(list(siblings)),
+            (LinkRequest.coupang_url == None) | (LinkRequest.coupang_url == "")
+        ).all():
+            source = by_hash[sibling.canonical_hash]
+            sibling.coupang_url = source.coupang_url
+            siblings[source.id] += 1
+            done.append(sibling)
+
+    rows = []
+    if done:
+        users = dict(db.session.query(User.email, User.id).filter(
+            User.email.in_({r.requester_email for r in done})
+        ).all())
+        now = datetime.utcnow()
+        rows = [{
+            "user_id": users[r.requester_email], "type": "link_completed", "title": "링크요청 완료",
+            "message": f"'{r.title}' 요청의 쿠팡 링크가 등록되었습니다!",
+            "link": f"/link-requests/{r.id}", "is_read": False, "created_at": now,
+        } for r in done if r.requester_email in users]
+    created = insert_notifications(rows)
+    db.session.commit()
+    publish_notifications(created)
+    return siblings
+
+
+def fulfill_link_request(it, coupang_url):
+    """관리자 단건 완료 처리 -> 함께 완료된 대기 요청 수"""
+    return fulfill_link_requests([(it, coupang_url)])[it.id]
+
+
+def stale_link_hash_filter():
+    """canonical_hash가 없거나 이전 정규화 규칙(LINK_HASH_VERSION 미만)으로 만든 요청"""
+    return (LinkRequest.canonical_version == None) | (LinkRequest.canonical_version < LINK_HASH_VERSION)
+
+
+def backfill_link_request_hashes(job_id):
+    """canonical_hash가 없거나 오래된 요청을 id 순서로 청크 단위 (재)계산 (배포 후 백그라운드 1회)"""
+    last_id, filled = 0, 0
+    while True:
+        rows = db.session.execute(
+            db.select(LinkRequest.id, LinkRequest.original_url)
+            .where(LinkRequest.id > last_id, stale_link_hash_filter())
+            .order_by(LinkRequest.id).limit(LINK_HASH_BACKFILL_CHUNK)
+        ).all()
+        if not rows:
+            break
+        db.session.execute(db.update(LinkRequest), [
+            {"id": rid, "canonical_hash": canonical_url_hash(url), "canonical_version": LINK_HASH_VERSION}
+            for rid, url in rows
+        ])
+        db.session.commit()
+        last_id = rows[-1][0]
+        filled += len(rows)
+        update_job(job_id, filled=filled)
+    update_job(job_id, status="done", filled=filled)
+    if filled:
+        print(f"[LINK HASH] canonical_hash 백필 완료: {filled}건")
+
+
+def link_request_missing_indexes(conn):
+    """아직 없는 링크요청 인덱스 {이름: 정의}. PostgreSQL은 CONCURRENTLY 실패로 남은 INVALID 인덱스도 없는 것으로 봄"""
+    wanted = dict(LINK_REQUEST_INDEXES)
+    if conn.dialect.name == "postgresql":
+        wanted.update(LINK_REQUEST_TRGM_INDEXES)
+        existing = {name for (name,) in conn.execute(db.text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE i.indrelid = 'link_request'::regclass AND i.indisvalid"
+        ))}
+    else:
+        existing = {ix["name"] for ix in inspect(conn).get_indexes("link_request")}
+    return {name: ddl for name, ddl in wanted.items() if name not in existing}
+
+
+def build_link_request_indexes(job_id):
+    """링크요청 인덱스 생성 (배포 후 백그라운드 1회).
+    PostgreSQL은 autocommit 연결에서 CREATE INDEX CONCURRENTLY로 테이블 쓰기를 막지 않고, advisory lock을 잡은 워커만 실행.
+    인덱스별로 실패를 기록하고 나머지는 계속 진행"""
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        pg = conn.dialect.name == "postgresql"
+        if pg and not conn.execute(db.text("SELECT pg_try_advisory_lock(:k)"), {"k": LINK_INDEX_LOCK_KEY}).scalar():
+            update_job(job_id, status="done", skipped=True)
+            return
+        try:
+            missing = link_request_missing_indexes(conn)
+            created, failed = [], []
+            if pg and any(name in LINK_REQUEST_TRGM_INDEXES for name in missing):
+                try:
+                    conn.execute(db.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                except Exception as e:
+                    print(f"[LINK INDEX] pg_trgm 확장 생성 실패 (검색은 순차 스캔): {e}")
+                    failed += [name for name in missing if name in LINK_REQUEST_TRGM_INDEXES]
+                    missing = {name: ddl for name, ddl in missing.items() if name not in LINK_REQUEST_TRGM_INDEXES}
+            for name, ddl in missing.items():
+                try:
+                    if pg:
+                        # 이전 CONCURRENTLY 실패로 남은 INVALID 인덱스 정리 후 재생성
+                        conn.execute(db.text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                        conn.execute(db.text(f"CREATE INDEX CONCURRENTLY {name} {ddl}"))
+                    else:
+                        conn.execute(db.text(f"CREATE INDEX IF NOT EXISTS {name} {ddl}"))
+                    created.append(name)
+                except Exception as e:
+                    failed.append(name)
+                    print(f"[LINK INDEX] {name} 생성 실패: {e}")
+                update_job(job_id, created=created, failed=failed)
+            update_job(job_id, status="done", created=created, failed=failed)
+            if created:
+                print(f"[LINK INDEX] 인덱스 생성 완료: {', '.join(created)}")
+        finally:
+            if pg:
+                conn.execute(db.text("SELECT pg_advisory_unlock(:k)"), {"k": LINK_INDEX_LOCK_KEY})
+
+
 # ----------------------------
 # 세션 업데이트 헬퍼
 # ----------------------------
@@ -884,6 +1965,7 @@ def serve_r2_file(filename):
 # Public Routes
 # ----------------------------
 @app.route("/")
+@anonymous_page_cache(timeout=tagged_ttl(3600, 60), tags=("post",))
 def index():
     try:
         featured_posts = Post.query.filter_by(is_featured=True).filter(Post.is_deleted != True).limit(4).all()
@@ -893,7 +1975,7 @@ def index():
 
 # [FIX #10] store 페이지는 로그인 무관 → 캐시 유지 OK
 @app.route("/store")
-@cache.cached(timeout=300)
+@cache.cached(timeout=tagged_ttl(21600, 300), make_cache_key=tagged_cache_key("store"))
 def store():
     products = StoreProduct.query.filter_by(is_active=True).order_by(StoreProduct.id.desc()).all()
 
@@ -917,6 +1999,7 @@ def store_chrome_extension():
     return render_template("store_chrome_extension.html")
 
 @app.route("/store/<int:product_id>")
+@anonymous_page_cache(timeout=tagged_ttl(3600, 300), tags=("store:{product_id}",))
 def store_detail(product_id):
     product = StoreProduct.query.get_or_404(product_id)
     if not product.is_active and not is_admin():
@@ -937,6 +2020,7 @@ def store_detail(product_id):
         ).first() is not None
     return render_template('store_detail.html', product=product, can_download_pg=can_download_pg, is_kakao=is_kakao, pg_pw_set=pg_pw_set, has_purchased=has_purchased)
 @app.route("/pricing")
+@anonymous_page_cache(timeout=tagged_ttl(3600, 300))
 def pricing():
     can_use_trial = False
     active_plans = []
@@ -948,6 +2032,32 @@ def pricing():
         active_plans = [s.plan_type for s in subs if s.is_active()]
     return render_template('pricing.html', can_use_trial=can_use_trial, active_plans=active_plans)
 
+class TokenBucket:
+    """초당 rate회 호출 제한 (버스트는 burst회까지). 스레드 간 공유"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = max(rate, 0.01)
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+aligo_limiter = TokenBucket(ALIGO_RATE_PER_SEC)
+
+
 def send_alimtalk(receiver, subject, message, tpl_code, button=None):
 
     """알리고 알림톡 발송"""
@@ -986,6 +2096,8 @@ def send_alimtalk(receiver, subject, message, tpl_code, button=None):
 
     try:
 
+        aligo_limiter.acquire()
+
         resp = requests.post(url, data=data, timeout=10)
 
         result = resp.json()
@@ -1002,6 +2114,38 @@ def send_alimtalk(receiver, subject, message, tpl_code, button=None):
 
 
 
+def send_alimtalk_bulk(tpl_code, items):
+    """알리고 다중 수신자 발송. items: [{"receiver", "subject", "message", "button"}] (최대 500건)"""
+    if not all([ALIGO_API_KEY, ALIGO_USER_ID, ALIGO_SENDER_KEY, ALIGO_SENDER]):
+        print("[알림톡] 설정 미완료 - 건너뜀")
+        return {"code": -1, "message": "설정 미완료"}
+    if not tpl_code:
+        print("[알림톡] 템플릿 미설정 - 건너뜀")
+        return {"code": -1, "message": "템플릿 미설정"}
+    url = "https://kakaoapi.aligo.in/akv10/alimtalk/send/"
+    data = {
+        "apikey": ALIGO_API_KEY, "userid": ALIGO_USER_ID,
+        "senderkey": ALIGO_SENDER_KEY, "tpl_code": tpl_code,
+        "sender": ALIGO_SENDER, "failover": "N", "testMode": "N",
+    }
+    for n, item in enumerate(items[:500], start=1):
+        data[f"receiver_{n}"] = item.get("receiver")
+        data[f"subject_{n}"] = item.get("subject")
+        data[f"message_{n}"] = item.get("message")
+        if item.get("button"):
+            data[f"button_{n}"] = json.dumps(item["button"])
+    try:
+        aligo_limiter.acquire()
+        resp = requests.post(url, data=data, timeout=30)
+        result = resp.json()
+        print(f"[알림톡] 대량 발송 {tpl_code} {len(items)}건: {result}")
+        return result
+    except Exception as e:
+        print(f"[알림톡] 대량 발송 실패: {e}")
+        return {"code": -99, "message": str(e)}
+
+
+
 
 
 def send_welcome_alimtalk(phone):
@@ -1010,7 +2154,7 @@ def send_welcome_alimtalk(phone):
 
     button = {"button": [{"name": "채널추가", "linkType": "AC"}, {"name": "마이페이지 바로가기", "linkType": "WL", "linkTypeName": "웹링크", "linkMo": "https://moneying.biz/my", "linkPc": "https://moneying.biz/my"}]}
 
-    return send_alimtalk(phone, "회원가입 완료 안내", msg, ALIGO_TPL_WELCOME, button)
+    return queue_alimtalk(phone, "회원가입 완료 안내", msg, ALIGO_TPL_WELCOME, button)
 
 
 def send_welcome_alimtalk_with_pw(phone, email, temp_pw):
@@ -1019,7 +2163,7 @@ def send_welcome_alimtalk_with_pw(phone, email, temp_pw):
 
     button = {"button": [{"name": "채널추가", "linkType": "AC"}, {"name": "마이페이지 바로가기", "linkType": "WL", "linkTypeName": "웹링크", "linkMo": "https://moneying.biz/my", "linkPc": "https://moneying.biz/my"}]}
 
-    return send_alimtalk(phone, "회원가입 완료 안내", msg, ALIGO_TPL_WELCOME, button)
+    return queue_alimtalk(phone, "회원가입 완료 안내", msg, ALIGO_TPL_WELCOME, button, sensitive=True)
 
 
 
@@ -1031,7 +2175,7 @@ def send_gallery_sub_alimtalk(phone, start_date, next_billing_date):
 
     button = {"button": [{"name": "채널추가", "linkType": "AC"}, {"name": "영상 갤러리 바로가기", "linkType": "WL", "linkTypeName": "웹링크", "linkMo": "https://moneying.biz/gallery", "linkPc": "https://moneying.biz/gallery"}]}
 
-    return send_alimtalk(phone, "영상 갤러리 구독 완료 안내", msg, ALIGO_TPL_GALLERY_SUB, button)
+    return queue_alimtalk(phone, "영상 갤러리 구독 완료 안내", msg, ALIGO_TPL_GALLERY_SUB, button)
 
 
 
@@ -1043,19 +2187,45 @@ def send_allinone_sub_alimtalk(phone, start_date, next_billing_date):
 
     button = {"button": [{"name": "채널추가", "linkType": "AC"}, {"name": "영상 갤러리 바로가기", "linkType": "WL", "linkTypeName": "웹링크", "linkMo": "https://moneying.biz/gallery", "linkPc": "https://moneying.biz/gallery"}, {"name": "프로핏가드 바로가기", "linkType": "WL", "linkTypeName": "웹링크", "linkMo": "https://moneying.biz/profitguard", "linkPc": "https://moneying.biz/profitguard"}]}
 
-    return send_alimtalk(phone, "올인원 패키지 구독 완료 안내", msg, ALIGO_TPL_ALLINONE_SUB, button)
-
+    return queue_alimtalk(phone, "올인원 패키지 구독 완료 안내", msg, ALIGO_TPL_ALLINONE_SUB, button)
+
+
+
+
+
+# 대량 발송(캠페인)과 개별 발송이 같은 문구를 쓰도록 템플릿 공유
+# message는 str.format 변수 ({name}) 사용, 알리고 등록 템플릿과 문구가 정확히 일치해야 함
+ALIMTALK_TEMPLATES = {
+    "renewal": {
+        "tpl_code": ALIGO_TPL_RENEWAL,
+        "subject": "구독 갱신 안내",
+        "message": "구독이 정상적으로 갱신되었습니다.\n\n상품명: {subscription_name}\n결제금액: {amount}\n결제일: {paid_at}",
+        "button": {"button": [{"name": "채널추가", "linkType": "AC"}, {"name": "마이페이지 바로가기", "linkType": "WL", "linkTypeName": "웹링크", "linkMo": "https://moneying.biz/my", "linkPc": "https://moneying.biz/my"}]},
+    },
+    "cancel": {
+        "tpl_code": ALIGO_TPL_CANCEL,
+        "subject": "구독 해지 완료 안내",
+        "message": "구독 해지가 완료되었습니다.\n\n이용 종료일: {end_date}\n종료일까지 기존 콘텐츠 이용이 가능합니다.",
+        "button": {"button": [{"name": "채널추가", "linkType": "AC"}, {"name": "마이페이지 바로가기", "linkType": "WL", "linkTypeName": "웹링크", "linkMo": "https://moneying.biz/my", "linkPc": "https://moneying.biz/my"}]},
+    },
+    "payment_fail": {
+        "tpl_code": ALIGO_TPL_PAYMENT_FAIL,
+        "subject": "자동결제 실패 안내",
+        "message": "구독 결제에 실패하여\n서비스 이용이 제한될 수 있습니다.\n\n결제 수단을 확인해 주세요.",
+        "button": {"button": [{"name": "채널추가", "linkType": "AC"}, {"name": "결제 정보 수정", "linkType": "WL", "linkTypeName": "웹링크", "linkMo": "https://moneying.biz/my/payments", "linkPc": "https://moneying.biz/my/payments"}]},
+    },
+}
 
 
+def render_alimtalk(key, **variables):
+    """템플릿 키 + 변수 -> (subject, message, tpl_code, button). 변수 누락 시 KeyError"""
+    tpl = ALIMTALK_TEMPLATES[key]
+    return tpl["subject"], tpl["message"].format(**variables), tpl["tpl_code"], tpl["button"]
 
 
 def send_renewal_alimtalk(phone, subscription_name, amount, paid_at):
 
-    msg = f"구독이 정상적으로 갱신되었습니다.\n\n상품명: {subscription_name}\n결제금액: {amount}\n결제일: {paid_at}"
-
-    button = {"button": [{"name": "채널추가", "linkType": "AC"}, {"name": "마이페이지 바로가기", "linkType": "WL", "linkTypeName": "웹링크", "linkMo": "https://moneying.biz/my", "linkPc": "https://moneying.biz/my"}]}
-
-    return send_alimtalk(phone, "구독 갱신 안내", msg, ALIGO_TPL_RENEWAL, button)
+    return queue_alimtalk(phone, *render_alimtalk("renewal", subscription_name=subscription_name, amount=amount, paid_at=paid_at))
 
 
 
@@ -1063,11 +2233,7 @@ def send_renewal_alimtalk(phone, subscription_name, amount, paid_at):
 
 def send_cancel_alimtalk(phone, end_date):
 
-    msg = f"구독 해지가 완료되었습니다.\n\n이용 종료일: {end_date}\n종료일까지 기존 콘텐츠 이용이 가능합니다."
-
-    button = {"button": [{"name": "채널추가", "linkType": "AC"}, {"name": "마이페이지 바로가기", "linkType": "WL", "linkTypeName": "웹링크", "linkMo": "https://moneying.biz/my", "linkPc": "https://moneying.biz/my"}]}
-
-    return send_alimtalk(phone, "구독 해지 완료 안내", msg, ALIGO_TPL_CANCEL, button)
+    return queue_alimtalk(phone, *render_alimtalk("cancel", end_date=end_date))
 
 
 
@@ -1079,7 +2245,7 @@ def send_product_payment_alimtalk(phone, product_name, amount, paid_at):
 
     button = {"button": [{"name": "채널추가", "linkType": "AC"}, {"name": "구매 상품 확인", "linkType": "WL", "linkTypeName": "웹링크", "linkMo": "https://moneying.biz/my/payments", "linkPc": "https://moneying.biz/my/payments"}]}
 
-    return send_alimtalk(phone, "상품 결제 완료 안내", msg, ALIGO_TPL_PAYMENT, button)
+    return queue_alimtalk(phone, "상품 결제 완료 안내", msg, ALIGO_TPL_PAYMENT, button)
 
 
 
@@ -1095,18 +2261,493 @@ def send_trial_alimtalk(phone, expire_date):
 
     button = {"name": "머닝 바로가기", "linkType": "WL", "linkTypeName": "웹링크", "linkMo": "https://moneying.biz/gallery", "linkPc": "https://moneying.biz/gallery"}
 
-    return send_alimtalk(phone, "무료 체험 시작 안내", msg, ALIGO_TPL_TRIAL, button)
+    return queue_alimtalk(phone, "무료 체험 시작 안내", msg, ALIGO_TPL_TRIAL, button)
 
 def send_payment_fail_alimtalk(phone):
 
-    msg = "구독 결제에 실패하여\n서비스 이용이 제한될 수 있습니다.\n\n결제 수단을 확인해 주세요."
+    return queue_alimtalk(phone, *render_alimtalk("payment_fail"))
+
+
 
-    button = {"button": [{"name": "채널추가", "linkType": "AC"}, {"name": "결제 정보 수정", "linkType": "WL", "linkTypeName": "웹링크", "linkMo": "https://moneying.biz/my/payments", "linkPc": "https://moneying.biz/my/payments"}]}
+# ============ 메시지 아웃박스 (이메일/알림톡 비동기 발송) ============
+# 요청 핸들러는 자기 트랜잭션 안에서 MessageOutbox 행만 추가하고,
+# 실제 SMTP/알리고 호출은 백그라운드 워커 풀이 재시도/데드레터 처리까지 담당
+_outbox_wakeup = threading.Event()
+_outbox_lock = threading.Lock()
+_outbox_executor = None
+_outbox_inflight = 0
+_campaign_inflight = 0
 
-    return send_alimtalk(phone, "자동결제 실패 안내", msg, ALIGO_TPL_PAYMENT_FAIL, button)
 
+# 발송이 끝나면 지우는 본문 키 (수신자/제목/템플릿은 이력 조회용으로 남김)
+OUTBOX_BODY_KEYS = ("html", "message", "button")
+
+
+def enqueue_message(channel, payload, max_attempts=None, sensitive=False):
+    """아웃박스에 메시지 적재 (커밋은 호출한 핸들러의 트랜잭션에서).
+    sensitive=True(임시 비밀번호 등)면 발송 성공뿐 아니라 건너뜀/데드레터로 끝나도 본문을 지움"""
+    if sensitive:
+        payload = dict(payload, sensitive=True)
+    row = MessageOutbox(
+        channel=channel,
+        payload=json.dumps(payload, ensure_ascii=False),
+        max_attempts=max_attempts or OUTBOX_MAX_ATTEMPTS,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.session.add(row)
+    db.session.info["outbox_pending"] = True
+    return row
+
+
+def queue_email(to_email, subject, html_body, sensitive=False):
+    if not OUTBOX_ENABLED:
+        return send_email(to_email, subject, html_body)
+    return enqueue_message("email", {"to": to_email, "subject": subject, "html": html_body}, sensitive=sensitive)
+
+
+def queue_alimtalk(receiver, subject, message, tpl_code, button=None, sensitive=False):
+    if not OUTBOX_ENABLED:
+        return send_alimtalk(receiver, subject, message, tpl_code, button)
+    return enqueue_message("alimtalk", {
+        "receiver": receiver, "subject": subject, "message": message,
+        "tpl_code": tpl_code, "button": button,
+    }, sensitive=sensitive)
+
+
+@event.listens_for(db.session, "after_commit")
+def _outbox_after_commit(sess):
+    if sess.info.pop("outbox_pending", False):
+        _outbox_wakeup.set()
+
+
+@event.listens_for(db.session, "after_rollback")
+def _outbox_after_rollback(sess):
+    sess.info.pop("outbox_pending", None)
+
+
+def _outbox_send(row):
+    """채널별 실제 발송. (status, note) 반환, 재시도 대상 실패는 예외"""
+    data = row.data()
+    if row.channel == "email":
+        if not MAIL_USERNAME or not MAIL_PASSWORD:
+            return "skipped", "메일 설정 없음"
+        deliver_email(data.get("to"), data.get("subject"), data.get("html"))
+        return "sent", None
+    if row.channel == "alimtalk":
+        result = send_alimtalk(data.get("receiver"), data.get("subject"), data.get("message"),
+                               data.get("tpl_code"), data.get("button"))
+        code = result.get("code")
+        if code == -1:  # 설정/템플릿 미완료
+            return "skipped", result.get("message")
+        if str(code) != "0":
+            raise RuntimeError(f"aligo code={code} {result.get('message')}")
+        return "sent", None
+    return "dead", f"알 수 없는 채널: {row.channel}"
+
+
+def _outbox_fetch_due(limit, campaign=False):
+    """발송할 행을 조건부 UPDATE로 선점 (다른 워커/프로세스와 중복 발송 방지)
+    campaign=True면 대량 발송 캠페인 행만, 아니면 개별 발송 행만"""
+    now = datetime.utcnow()
+    # 워커가 죽어서 sending에 묶인 행 회수
+    db.session.execute(
+        db.update(MessageOutbox)
+        .where(MessageOutbox.status == "sending", MessageOutbox.locked_until < now)
+        .values(status="pending")
+    )
+    q = db.session.query(MessageOutbox.id).filter(
+        MessageOutbox.status == "pending",
+        MessageOutbox.next_attempt_at <= now,
+        MessageOutbox.campaign_id.isnot(None) if campaign else MessageOutbox.campaign_id.is_(None),
+    )
+    ids = [i for (i,) in q.order_by(MessageOutbox.id).limit(limit).all()]
+    if not ids:
+        db.session.commit()
+        return []
+    # 한 번의 UPDATE로 선점하고, 이번 선점에만 쓰인 locked_until 값으로 내 몫을 다시 조회
+    lock = now + timedelta(seconds=OUTBOX_LOCK_SECONDS, microseconds=secrets.randbelow(10 ** 6))
+    db.session.execute(
+        db.update(MessageOutbox)
+        .where(MessageOutbox.id.in_(ids), MessageOutbox.status == "pending")
+        .values(status="sending", locked_until=lock)
+    )
+    claimed = db.session.query(MessageOutbox.id, MessageOutbox.channel, MessageOutbox.campaign_id).filter(
+        MessageOutbox.id.in_(ids),
+        MessageOutbox.status == "sending",
+        MessageOutbox.locked_until == lock,
+    ).order_by(MessageOutbox.id).all()
+    db.session.commit()
+    return claimed
 
 
+def _outbox_redact(row):
+    """본문 제거 (임시 비밀번호 등이 DB에 남지 않게). 지운 행은 재시도 불가"""
+    data = row.data()
+    if data.get("redacted"):
+        return
+    data = {k: v for k, v in data.items() if k not in OUTBOX_BODY_KEYS}
+    data["redacted"] = True
+    row.payload = json.dumps(data, ensure_ascii=False)
+
+
+def _outbox_finish(row, status=None, note=None, error=None):
+    """발송 결과 반영. error가 있으면 백오프 후 재시도, 한도 초과 시 데드레터.
+    발송된 행은 본문을 지우고, 민감 행은 건너뜀/데드레터로 끝나도 지움 (일반 행은 관리자 재시도용으로 보존 기간까지 유지)"""
+    row.attempts = (row.attempts or 0) + 1
+    row.locked_until = None
+    if error is None:
+        row.status = status
+        row.last_error = note
+        if status == "sent":
+            row.sent_at = datetime.utcnow()
+        if status == "sent" or row.data().get("sensitive"):
+            _outbox_redact(row)
+        return
+    row.last_error = str(error)[:1000]
+    if row.attempts >= (row.max_attempts or OUTBOX_MAX_ATTEMPTS):
+        row.status = "dead"
+        if row.data().get("sensitive"):
+            _outbox_redact(row)
+        print(f"[OUTBOX] 데드레터 #{row.id} ({row.channel}): {error}")
+    else:
+        row.status = "pending"
+        backoff = min(3600, 30 * 2 ** (row.attempts - 1))
+        row.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff)
+
+
+def _outbox_send_campaign(rows):
+    """같은 캠페인(=같은 템플릿) 알림톡을 다중 수신자 요청 1건으로 발송"""
+    payloads = [r.data() for r in rows]
+    result = send_alimtalk_bulk(payloads[0].get("tpl_code"), payloads)
+    code = result.get("code")
+    if code == -1:  # 설정/템플릿 미완료
+        for row in rows:
+            _outbox_finish(row, "skipped", result.get("message"))
+    elif str(code) == "0":
+        note = f"mid={(result.get('info') or {}).get('mid')}"
+        for row in rows:
+            _outbox_finish(row, "sent", note)
+    else:
+        error = RuntimeError(f"aligo code={code} {result.get('message')}")
+        for row in rows:
+            _outbox_finish(row, error=error)
+
+
+def _outbox_process(row_ids, campaign=False):
+    """선점한 행 처리. 이메일 여러 건은 SMTP 연결 하나로, 캠페인 알림톡은 다중 수신자 요청으로 발송"""
+    global _outbox_inflight, _campaign_inflight
+    try:
+        with app.app_context():
+            rows = MessageOutbox.query.filter(
+                MessageOutbox.id.in_(row_ids),
+                MessageOutbox.status == "sending"
+            ).order_by(MessageOutbox.id).all()
+            if campaign:
+                bulk = [r for r in rows if r.channel == "alimtalk"]
+                if bulk:
+                    _outbox_send_campaign(bulk)
+                rows = [r for r in rows if r.channel != "alimtalk"]
+            emails = [r for r in rows if r.channel == "email"]
+            if len(emails) > 1 and MAIL_USERNAME and MAIL_PASSWORD:
+                batch = [(d.get("to"), d.get("subject"), d.get("html")) for d in (r.data() for r in emails)]
+                for row, (ok, error) in zip(emails, smtp_pool.send_batch(batch)):
+                    _outbox_finish(row, "sent", error=None if ok else error)
+                rows = [r for r in rows if r.channel != "email"]
+            for row in rows:
+                try:
+                    status, note = _outbox_send(row)
+                    _outbox_finish(row, status, note)
+                except Exception as e:
+                    _outbox_finish(row, error=e)
+            db.session.commit()
+    except Exception as e:
+        print(f"[OUTBOX] 처리 오류 {row_ids[:5]}..({len(row_ids)}건): {e}")
+    finally:
+        with _outbox_lock:
+            if campaign:
+                _campaign_inflight -= 1
+            else:
+                _outbox_inflight -= len(row_ids)
+        if campaign:
+            _outbox_wakeup.set()  # 남은 캠페인 묶음 바로 이어서 발송
+
+
+def _outbox_dispatch_campaigns():
+    """캠페인 행을 캠페인별 ALIGO_BULK_SIZE 단위로 묶어 제출 (동시 요청 수는 워커 수 이내)"""
+    global _campaign_inflight
+    with _outbox_lock:
+        slots = OUTBOX_WORKERS - _campaign_inflight
+    if slots <= 0:
+        return False
+    with app.app_context():
+        claimed = _outbox_fetch_due(slots * ALIGO_BULK_SIZE, campaign=True)
+    groups = {}
+    for row_id, _, campaign_id in claimed:
+        groups.setdefault(campaign_id, []).append(row_id)
+    for ids in groups.values():
+        for i in range(0, len(ids), ALIGO_BULK_SIZE):
+            with _outbox_lock:
+                _campaign_inflight += 1
+            _outbox_executor.submit(_outbox_process, ids[i:i + ALIGO_BULK_SIZE], True)
+    return len(claimed) == slots * ALIGO_BULK_SIZE
+
+
+def _outbox_purge():
+    """보존 기간이 지난 완료 행 삭제 (캠페인 행은 캠페인 진행률 집계에 쓰므로 제외, 본문은 발송 시 이미 지워짐)"""
+    cutoff = datetime.utcnow() - timedelta(days=OUTBOX_RETENTION_DAYS)
+    with app.app_context():
+        res = db.session.execute(db.delete(MessageOutbox).where(
+            MessageOutbox.status.in_(["sent", "skipped", "dead"]),
+            MessageOutbox.created_at < cutoff,
+            MessageOutbox.campaign_id.is_(None),
+        ))
+        db.session.commit()
+    if res.rowcount:
+        print(f"[OUTBOX] 보존 기간 지난 행 {res.rowcount}건 삭제")
+
+
+def _outbox_loop():
+    global _outbox_inflight
+    last_purge = 0
+    while True:
+        _outbox_wakeup.wait(OUTBOX_POLL_INTERVAL)
+        _outbox_wakeup.clear()
+        if time.monotonic() - last_purge > OUTBOX_PURGE_INTERVAL:
+            last_purge = time.monotonic()
+            try:
+                _outbox_purge()
+            except Exception as e:
+                print(f"[OUTBOX] 보존 기간 정리 오류: {e}")
+        try:
+            more = _outbox_dispatch_campaigns()
+            # 워커 풀이 밀려 있으면 더 선점하지 않음 (lock 만료로 인한 중복 발송 방지)
+            with _outbox_lock:
+                capacity = OUTBOX_WORKERS * OUTBOX_EMAIL_BATCH - _outbox_inflight
+            if capacity > 0:
+                with app.app_context():
+                    claimed = _outbox_fetch_due(min(OUTBOX_BATCH_SIZE, capacity))
+                email_ids = [i for i, ch, _ in claimed if ch == "email"]
+                tasks = [email_ids[i:i + OUTBOX_EMAIL_BATCH] for i in range(0, len(email_ids), OUTBOX_EMAIL_BATCH)]
+                tasks += [[i] for i, ch, _ in claimed if ch != "email"]
+                for task in tasks:
+                    with _outbox_lock:
+                        _outbox_inflight += len(task)
+                    _outbox_executor.submit(_outbox_process, task)
+                more = more or (claimed and len(claimed) == min(OUTBOX_BATCH_SIZE, capacity))
+            if more:
+                _outbox_wakeup.set()
+        except Exception as e:
+            print(f"[OUTBOX] 디스패처 오류: {e}")
+            time.sleep(OUTBOX_POLL_INTERVAL)
+
+
+def start_outbox_worker():
+    """프로세스(gunicorn 워커)마다 디스패처 1개 + 발송 스레드 풀 기동"""
+    global _outbox_executor
+    with _outbox_lock:
+        if _outbox_executor is not None or not OUTBOX_ENABLED:
+            return
+        _outbox_executor = ThreadPoolExecutor(max_workers=OUTBOX_WORKERS, thread_name_prefix="outbox")
+    threading.Thread(target=_outbox_loop, name="outbox-dispatcher", daemon=True).start()
+    print(f"[OUTBOX] 워커 시작 (workers={OUTBOX_WORKERS})")
+
+
+@app.route("/admin/api/outbox")
+def admin_outbox_status():
+    if not is_admin():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    counts = dict(db.session.query(
+        MessageOutbox.status, db.func.count(MessageOutbox.id)
+    ).group_by(MessageOutbox.status).all())
+    dead = MessageOutbox.query.filter_by(status="dead").order_by(desc(MessageOutbox.id)).limit(50).all()
+    return jsonify({
+        "ok": True,
+        "counts": counts,
+        "dead": [{
+            "id": m.id, "channel": m.channel, "attempts": m.attempts,
+            "last_error": m.last_error,
+            "created_at": m.created_at.isoformat() if m.created_at else None,
+        } for m in dead],
+    })
+
+
+@app.route("/admin/api/outbox/<int:msg_id>/retry", methods=["POST"])
+def admin_outbox_retry(msg_id):
+    if not is_admin():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    m = MessageOutbox.query.get_or_404(msg_id)
+    if m.status not in ("dead", "skipped"):
+        return jsonify({"ok": False, "error": "재시도할 수 없는 상태입니다."}), 400
+    if m.data().get("redacted"):
+        return jsonify({"ok": False, "error": "본문이 삭제된 메시지라 재시도할 수 없습니다."}), 400
+    m.status = "pending"
+    m.attempts = 0
+    m.next_attempt_at = datetime.utcnow()
+    db.session.info["outbox_pending"] = True
+    db.session.commit()
+    return jsonify({"ok": True})
+
+
+def _normalize_phone(phone):
+    digits = "".join(ch for ch in str(phone or "") if ch.isdigit())
+    return digits if digits.startswith("01") and 10 <= len(digits) <= 11 else None
+
+
+def _campaign_segment(segment):
+    """세그먼트 수신자 목록 [{"phone", "vars"}] (휴대폰 번호 있는 회원만)"""
+    if segment == "active_subscribers":
+        now = datetime.utcnow()
+        active = [Subscription.status == "active", db.or_(Subscription.expires_at.is_(None), Subscription.expires_at > now)]
+        rows = db.session.query(User, Subscription).join(Subscription, Subscription.user_id == User.id).filter(
+            User.phone.isnot(None), User.phone != "", *active,
+        ).order_by(User.id, desc(Subscription.id)).all()
+        seen = set()
+        latest = []
+        for u, sub in rows:
+            if u.id in seen:
+                continue
+            seen.add(u.id)
+            latest.append((u, sub))
+        # 결제일은 구독별 최근 결제 (결제 기록이 없으면 구독 시작일)
+        paid = dict(db.session.query(PaymentHistory.subscription_id, db.func.max(PaymentHistory.paid_at)).filter(
+            PaymentHistory.subscription_id.in_(db.select(Subscription.id).where(*active)),
+            PaymentHistory.status == "paid",
+        ).group_by(PaymentHistory.subscription_id).all()) if latest else {}
+        result = []
+        for u, sub in latest:
+            paid_at = paid.get(sub.id) or sub.started_at
+            result.append({"phone": u.phone, "vars": {
+                "nickname": u.nickname or "", "email": u.email,
+                "subscription_name": PLAN_INFO.get(sub.plan_type, {}).get("name", sub.plan_type),
+                "amount": f"{sub.price or 0:,}원",
+                "paid_at": paid_at.strftime("%Y-%m-%d") if paid_at else "",
+                "end_date": sub.expires_at.strftime("%Y-%m-%d") if sub.expires_at else "",
+            }})
+        return result
+    if segment == "all":
+        users = User.query.filter(User.phone.isnot(None), User.phone != "").order_by(User.id).all()
+        return [{"phone": u.phone, "vars": {"nickname": u.nickname or "", "email": u.email}} for u in users]
+    raise ValueError(f"알 수 없는 세그먼트: {segment}")
+
+
+def create_alimtalk_campaign(recipients, template=None, tpl_code=None, subject=None, message=None,
+                             button=None, common_vars=None, name=None):
+    """수신자별 변수로 문구를 렌더링해 아웃박스에 일괄 적재. 워커가 ALIGO_BULK_SIZE 단위로 발송"""
+    if template:
+        tpl = ALIMTALK_TEMPLATES[template]
+        tpl_code = tpl_code or tpl["tpl_code"]
+        subject, message, button = tpl["subject"], tpl["message"], tpl["button"]
+    if not tpl_code or not message:
+        raise ValueError("tpl_code와 message(또는 template)가 필요합니다.")
+
+    now = datetime.utcnow()
+    rows, rejected, seen = [], [], set()
+    for r in recipients:
+        phone = _normalize_phone(r.get("phone"))
+        if not phone:
+            rejected.append({"phone": r.get("phone"), "error": "잘못된 번호"})
+            continue
+        if phone in seen:
+            continue
+        seen.add(phone)
+        try:
+            text_ = message.format(**{**(common_vars or {}), **(r.get("vars") or {})})
+        except (KeyError, IndexError, ValueError) as e:
+            rejected.append({"phone": phone, "error": f"변수 누락: {e}"})
+            continue
+        rows.append({
+            "channel": "alimtalk",
+            "payload": json.dumps({"receiver": phone, "subject": subject, "message": text_,
+                                   "tpl_code": tpl_code, "button": button}, ensure_ascii=False),
+            "status": "pending", "attempts": 0, "max_attempts": OUTBOX_MAX_ATTEMPTS,
+            "next_attempt_at": now, "created_at": now,
+        })
+
+    campaign = AlimtalkCampaign(name=name, tpl_code=tpl_code, subject=subject,
+                                total=len(rows), rejected=len(rejected))
+    db.session.add(campaign)
+    db.session.flush()
+    for row in rows:
+        row["campaign_id"] = campaign.id
+    for i in range(0, len(rows), 1000):
+        db.session.execute(db.insert(MessageOutbox), rows[i:i + 1000])
+    db.session.info["outbox_pending"] = True
+    return campaign, rejected
+
+
+@app.route("/admin/api/alimtalk/campaign", methods=["POST"])
+def admin_alimtalk_campaign_create():
+    """알림톡 대량 발송
+    body: {"template": "renewal"} 또는 {"tpl_code", "subject", "message", "button"},
+          {"recipients": [{"phone", "vars": {...}}]} 또는 {"segment": "active_subscribers"|"all"},
+          "vars": 공통 변수, "name": 캠페인명"""
+    if not is_admin():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    data = request.get_json(silent=True) or {}
+    template = data.get("template")
+    if template and template not in ALIMTALK_TEMPLATES:
+        return jsonify({"ok": False, "error": f"알 수 없는 템플릿: {template}"}), 400
+    try:
+        recipients = _campaign_segment(data["segment"]) if data.get("segment") else (data.get("recipients") or [])
+        if not recipients:
+            return jsonify({"ok": False, "error": "수신자가 없습니다."}), 400
+        campaign, rejected = create_alimtalk_campaign(
+            recipients, template=template, tpl_code=data.get("tpl_code"),
+            subject=data.get("subject"), message=data.get("message"), button=data.get("button"),
+            common_vars=data.get("vars"), name=data.get("name"),
+        )
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    if not campaign.total:
+        db.session.rollback()
+        return jsonify({"ok": False, "error": "발송 가능한 수신자가 없습니다.", "rejected": rejected[:100]}), 400
+    db.session.commit()
+    print(f"[알림톡] 캠페인 #{campaign.id} 적재 {campaign.total}건 (제외 {len(rejected)}건)")
+    return jsonify({"ok": True, "campaign_id": campaign.id, "queued": campaign.total, "rejected": rejected[:100]})
+
+
+@app.route("/admin/api/alimtalk/campaign/<int:campaign_id>")
+def admin_alimtalk_campaign_status(campaign_id):
+    if not is_admin():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    campaign = AlimtalkCampaign.query.get_or_404(campaign_id)
+    counts = dict(db.session.query(
+        MessageOutbox.status, db.func.count(MessageOutbox.id)
+    ).filter(MessageOutbox.campaign_id == campaign_id).group_by(MessageOutbox.status).all())
+    failed = MessageOutbox.query.filter(
+        MessageOutbox.campaign_id == campaign_id, MessageOutbox.status.in_(["dead", "skipped"])
+    ).order_by(MessageOutbox.id).limit(100).all()
+    done = sum(counts.get(k, 0) for k in ("sent", "skipped", "dead"))
+    return jsonify({
+        "ok": True,
+        "campaign": {
+            "id": campaign.id, "name": campaign.name, "tpl_code": campaign.tpl_code,
+            "total": campaign.total, "rejected": campaign.rejected,
+            "created_at": campaign.created_at.isoformat() if campaign.created_at else None,
+        },
+        "counts": counts,
+        "progress": round(done / campaign.total * 100, 1) if campaign.total else 100.0,
+        "failed": [{
+            "id": m.id, "receiver": m.data().get("receiver"), "status": m.status,
+            "attempts": m.attempts, "last_error": m.last_error,
+        } for m in failed],
+    })
+
+
+@app.route("/admin/api/perf-stats")
+def admin_perf_stats():
+    """발송/처리 성능 지표 (SMTP 처리량, 메시지당 지연 등)"""
+    if not is_admin():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    with _outbox_lock:
+        inflight = _outbox_inflight
+    return jsonify({
+        "ok": True,
+        "smtp": smtp_pool.stats(),
+        "password_hash": password_hasher.stats(),
+        "outbox": {"inflight": inflight, "email_batch": OUTBOX_EMAIL_BATCH},
+    })
+
 
 
 # ============ 토스페이먼츠 결제 ============
@@ -1277,6 +2918,16 @@ def payment_success():
 
     db.session.add(payment)
 
+    # 알림톡 (결제 완료) - 아웃박스에 적재, 결제 트랜잭션과 함께 커밋
+    user = db.session.get(User, user_id)
+    if user and user.phone:
+        send_product_payment_alimtalk(
+            phone=user.phone,
+            product_name=plan['name'],
+            amount=plan['price'],
+            paid_at=now.strftime('%Y-%m-%d %H:%M')
+        )
+
     db.session.commit()
 
 
@@ -1338,25 +2989,6 @@ def payment_success():
     except Exception as e:
         print(f"[리워드] 추천 보상 처리 오류: {e}")
 
-    # 알림톡 발송 (결제 완료)
-
-    try:
-
-        user = db.session.get(User, user_id) if not user else user
-
-        if user and user.phone:
-
-            send_product_payment_alimtalk(
-                phone=user.phone,
-                product_name=plan['name'],
-                amount=plan['price'],
-                paid_at=datetime.utcnow().strftime('%Y-%m-%d %H:%M')
-            )
-
-    except Exception as e:
-
-        print(f"[알림톡] 결제 알림 발송 오류: {e}")
-
 
 
     if plan['billing']:
@@ -1480,12 +3112,14 @@ def api_profitguard_set_password():
 
         return jsonify({"result": "FAIL", "msg": "비밀번호는 8자 이상이어야 합니다."})
 
-    user.pw_hash = generate_password_hash(password)
+    user.pw_hash = hash_password(password)
 
     user.pg_password_set = True
 
     user.pg_api_token = None
 
+    revoke_pg_tokens(user.id)
+
     db.session.commit()
 
     return jsonify({"result": "SUCCESS", "msg": "비밀번호가 설정되었습니다."})
@@ -1556,6 +3190,162 @@ def profitguard_download():
 
 
 
+# ============ 프로핏가드 서명 토큰 ============
+# 토큰 = "pg1." + base64url(payload JSON) + "." + base64url(HMAC-SHA256)
+# payload: uid, email, name, tier, trial, hwid, iat, exp -> 검증에 DB 조회 불필요
+# 비밀번호 변경/기기 초기화 시 revoke_pg_tokens()로 해당 유저의 기존 토큰 일괄 무효화.
+# 프로핏가드 구독 생성/해지/업그레이드는 before_flush에서 잡아 기존 토큰을 만료로 취급 -> 다음 확인 때 새 등급으로 재발급
+PG_TOKEN_PREFIX = "pg1."
+PG_PLAN_TYPES = ["profitguard_pro", "profitguard_lite", "profitguard_lifetime", "allinone"]
+
+_pg_revoked = {}
+_pg_revoked_loaded_at = 0.0
+_pg_revoked_lock = threading.Lock()
+
+
+def _b64url(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _b64url_decode(value):
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _pg_sign(body):
+    return _b64url(hmac.new(PG_TOKEN_SECRET.encode(), body.encode(), hashlib.sha256).digest())
+
+
+def get_pg_tier(user):
+    """프로핏가드 이용 등급 -> (tier, is_trial, 만료 시각 또는 None)"""
+    now = datetime.utcnow()
+    pg_sub = Subscription.query.filter(
+        Subscription.user_id == user.id,
+        Subscription.status == "active",
+        Subscription.plan_type.in_(PG_PLAN_TYPES)
+    ).first()
+    if pg_sub and pg_sub.is_active():
+        if pg_sub.plan_type in ["profitguard_pro", "allinone", "profitguard_lifetime"]:
+            return "PRO", False, pg_sub.expires_at
+        if pg_sub.plan_type == "profitguard_lite":
+            return "BASIC", False, pg_sub.expires_at
+    if user.free_trial_expires and user.free_trial_expires > now:
+        return "PRO", True, user.free_trial_expires
+    return "FREE", False, None
+
+
+def issue_pg_token(user, tier, is_trial, expires_at=None):
+    """서명 토큰 발급. 만료는 TTL과 구독/체험 만료 중 이른 시각"""
+    now_ms = int(time.time() * 1000)
+    now = now_ms // 1000
+    exp = now + PG_TOKEN_TTL
+    if expires_at:
+        exp = min(exp, int((expires_at - datetime(1970, 1, 1)).total_seconds()))
+    payload = {
+        "uid": user.id, "email": user.email,
+        "name": user.nickname or user.email.split("@")[0],
+        "tier": tier, "trial": bool(is_trial), "hwid": user.profitguard_hwid or "",
+        "iat": now, "iat_ms": now_ms, "exp": exp,
+    }
+    body = _b64url(json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode())
+    return f"{PG_TOKEN_PREFIX}{body}.{_pg_sign(body)}"
+
+
+def _pg_epoch(dt):
+    """epoch 밀리초 (iat는 초 단위라 같은 초에 발급된 토큰과 폐기 순서를 가리려면 더 정밀해야 함)"""
+    return int((dt - datetime(1970, 1, 1)).total_seconds() * 1000) if dt else 0
+
+
+def _pg_revocation(user_id):
+    """(폐기 기준, 등급 변경 기준) epoch 밀리초. 프로세스 메모리에 두고 PG_REVOCATION_REFRESH초마다 갱신"""
+    global _pg_revoked, _pg_revoked_loaded_at
+    if time.monotonic() - _pg_revoked_loaded_at > PG_REVOCATION_REFRESH:
+        with _pg_revoked_lock:
+            if time.monotonic() - _pg_revoked_loaded_at > PG_REVOCATION_REFRESH:
+                # TTL보다 오래된 기록은 해당 토큰이 이미 만료됐으므로 불필요
+                since = datetime.utcnow() - timedelta(seconds=PG_TOKEN_TTL)
+                rows = PgTokenRevocation.query.filter(
+                    (PgTokenRevocation.not_before > since) | (PgTokenRevocation.replan_before > since)
+                ).all()
+                _pg_revoked = {r.user_id: (_pg_epoch(r.not_before), _pg_epoch(r.replan_before)) for r in rows}
+                _pg_revoked_loaded_at = time.monotonic()
+    return _pg_revoked.get(user_id, (0, 0))
+
+
+def verify_pg_token(token, allow_expired=False):
+    """서명/폐기/만료 확인 후 payload 반환, 실패 시 None.
+    allow_expired=True면 만료만 된 토큰도 반환 (DB 재평가 후 재발급 용도)"""
+    if not token or not token.startswith(PG_TOKEN_PREFIX):
+        return None
+    try:
+        body, sig = token[len(PG_TOKEN_PREFIX):].split(".", 1)
+        if not hmac.compare_digest(sig, _pg_sign(body)):
+            return None
+        claims = json.loads(_b64url_decode(body))
+        revoked, replan = _pg_revocation(claims["uid"])
+        # iat_ms가 없는 이전 토큰은 초 단위 iat로 비교 (같은 초의 폐기도 그 초의 시작 이후라 무효 처리됨)
+        issued = claims.get("iat_ms", claims["iat"] * 1000)
+        if issued < revoked:
+            return None
+        if issued < replan:
+            # 발급 후 구독이 생성/해지/변경됨 -> 토큰의 tier를 믿지 않고 만료 경로(DB 재평가)로
+            claims["exp"] = 0
+        if not allow_expired and claims["exp"] <= time.time():
+            return None
+        return claims
+    except Exception:
+        return None
+
+
+def _pg_revocation_row(sess, user_id):
+    with sess.no_autoflush:
+        row = sess.get(PgTokenRevocation, user_id)
+    if not row:
+        row = PgTokenRevocation(user_id=user_id, not_before=datetime(1970, 1, 1))
+        sess.add(row)
+    return row
+
+
+def revoke_pg_tokens(user_id):
+    """해당 유저에게 지금까지 발급된 서명 토큰 무효화 (커밋은 호출한 쪽에서)"""
+    now = datetime.utcnow()
+    _pg_revocation_row(db.session, user_id).not_before = now
+    # 이 프로세스는 즉시 반영, 다른 워커는 다음 갱신 주기에 반영
+    with _pg_revoked_lock:
+        _pg_revoked[user_id] = (_pg_epoch(now), _pg_revoked.get(user_id, (0, 0))[1])
+
+
+def mark_pg_plan_changed(sess, user_id):
+    """등급이 바뀔 수 있는 구독 변경: 기존 토큰은 로그아웃 없이 다음 확인 때 DB 재평가 후 재발급"""
+    now = datetime.utcnow()
+    _pg_revocation_row(sess, user_id).replan_before = now
+    with _pg_revoked_lock:
+        _pg_revoked[user_id] = (_pg_revoked.get(user_id, (0, 0))[0], _pg_epoch(now))
+
+
+@event.listens_for(db.session, "before_flush")
+def _pg_plan_change_listener(sess, flush_context, instances):
+    """프로핏가드 등급에 영향을 주는 구독 생성/해지/변경/삭제를 잡아 해당 유저 토큰의 등급을 무효화"""
+    user_ids = set()
+    for obj in sess.new:
+        if isinstance(obj, Subscription) and obj.plan_type in PG_PLAN_TYPES:
+            user_ids.add(obj.user_id)
+    for obj in sess.deleted:
+        if isinstance(obj, Subscription) and obj.plan_type in PG_PLAN_TYPES:
+            user_ids.add(obj.user_id)
+    for obj in sess.dirty:
+        if not isinstance(obj, Subscription):
+            continue
+        attrs = inspect(obj).attrs
+        plan_types = {obj.plan_type, *attrs.plan_type.history.deleted}
+        if plan_types & set(PG_PLAN_TYPES) and any(
+            getattr(attrs, name).history.has_changes() for name in ("status", "plan_type", "expires_at", "user_id")
+        ):
+            user_ids.add(obj.user_id)
+            user_ids.update(attrs.user_id.history.deleted)
+    for user_id in user_ids - {None}:
+        mark_pg_plan_changed(sess, user_id)
+
+
 # ============ 프로핏가드 API ============
 
 @app.route("/api/profitguard", methods=["POST"])
@@ -1598,7 +3388,7 @@ def api_profitguard():
                 user.login_fail_count = 0
                 db.session.commit()
 
-        if not user or not check_password_hash(user.pw_hash, password):
+        if not user or not verify_and_upgrade_password(user, password):
             if user:
                 user.login_fail_count = (user.login_fail_count or 0) + 1
                 if user.login_fail_count >= 5:
@@ -1610,49 +3400,9 @@ def api_profitguard():
 
 
 
-        # 구독 상태 확인 (프로핏가드 관련 플랜)
-
-        now = datetime.utcnow()
-
-        tier = "FREE"
-
-        is_trial = False
-
-
-
-        # 프로핏가드 구독 확인
-
-        pg_sub = Subscription.query.filter(
-
-            Subscription.user_id == user.id,
-
-            Subscription.status == "active",
-
-            Subscription.plan_type.in_(["profitguard_pro", "profitguard_lite", "profitguard_lifetime", "allinone"])
-
-        ).first()
-
-
-
-        if pg_sub and pg_sub.is_active():
-
-            if pg_sub.plan_type in ["profitguard_pro", "allinone", "profitguard_lifetime"]:
-
-                tier = "PRO"
-
-            elif pg_sub.plan_type == "profitguard_lite":
-
-                tier = "BASIC"
-
-
+        # 구독 상태 확인 (프로핏가드 관련 플랜 + 무료체험)
 
-        # 무료체험 확인
-
-        if tier == "FREE" and user.free_trial_expires and user.free_trial_expires > now:
-
-            tier = "PRO"
-
-            is_trial = True
+        tier, is_trial, expires_at = get_pg_tier(user)
 
 
 
@@ -1678,12 +3428,11 @@ def api_profitguard():
 
 
 
-        # 로그인 성공: 실패 카운터 리셋 + 토큰 발급
+        # 로그인 성공: 실패 카운터 리셋 + 서명 토큰 발급
         user.login_fail_count = 0
         user.locked_until = None
-        token = secrets.token_hex(32)
-        user.pg_api_token = token
         db.session.commit()
+        token = issue_pg_token(user, tier, is_trial, expires_at)
 
         user_name = user.nickname or user.email.split("@")[0]
 
@@ -1697,30 +3446,23 @@ def api_profitguard():
         if not email or not token:
             return jsonify({"result": "FAIL", "msg": "이메일과 토큰을 입력해주세요."})
 
-        user = User.query.filter_by(email=email).first()
-        if not user or not user.pg_api_token or user.pg_api_token != token:
+        # 서명 토큰이 유효하고 기기가 일치하면 DB 조회 없이 응답
+        claims = verify_pg_token(token, allow_expired=True)
+        if claims and claims.get("email") == email:
+            if claims["exp"] > time.time() and (not hwid or claims.get("hwid") == hwid):
+                return jsonify({"result": "SUCCESS", "tier": claims["tier"], "is_trial": claims["trial"],
+                                "user_name": claims["name"], "token": token})
+            user = db.session.get(User, claims["uid"])
+        else:
+            # 이전 버전 클라이언트의 랜덤 토큰 (pg_api_token) 호환
+            user = User.query.filter_by(email=email).first()
+            if not user or not user.pg_api_token or not hmac.compare_digest(user.pg_api_token, token):
+                user = None
+        if not user or user.email != email:
             return jsonify({"result": "TOKEN_EXPIRED", "msg": "토큰이 만료되었습니다. 비밀번호로 다시 로그인해주세요."})
 
-        # 구독 상태 확인
-        now = datetime.utcnow()
-        tier = "FREE"
-        is_trial = False
-
-        pg_sub = Subscription.query.filter(
-            Subscription.user_id == user.id,
-            Subscription.status == "active",
-            Subscription.plan_type.in_(["profitguard_pro", "profitguard_lite", "profitguard_lifetime", "allinone"])
-        ).first()
-
-        if pg_sub and pg_sub.is_active():
-            if pg_sub.plan_type in ["profitguard_pro", "allinone", "profitguard_lifetime"]:
-                tier = "PRO"
-            elif pg_sub.plan_type == "profitguard_lite":
-                tier = "BASIC"
-
-        if tier == "FREE" and user.free_trial_expires and user.free_trial_expires > now:
-            tier = "PRO"
-            is_trial = True
+        # 만료/기기 미등록/구버전 토큰: 구독 상태를 DB에서 재평가 후 서명 토큰 재발급
+        tier, is_trial, expires_at = get_pg_tier(user)
 
         if tier == "FREE":
             return jsonify({"result": "FAIL", "msg": "구독 중인 프로핏가드 플랜이 없습니다.\nmoneying.biz에서 구독 후 이용해주세요."})
@@ -1729,12 +3471,14 @@ def api_profitguard():
         if hwid:
             if not user.profitguard_hwid:
                 user.profitguard_hwid = hwid
-                db.session.commit()
             elif user.profitguard_hwid != hwid:
                 return jsonify({"result": "DEVICE_ERROR", "msg": "이미 다른 기기에 등록되어 있습니다.\n기기 초기화 후 다시 시도해주세요.\n(기기 변경은 월 1회 가능)"})
+        user.pg_api_token = None
+        db.session.commit()
 
         user_name = user.nickname or user.email.split("@")[0]
-        return jsonify({"result": "SUCCESS", "tier": tier, "is_trial": is_trial, "user_name": user_name, "token": token})
+        return jsonify({"result": "SUCCESS", "tier": tier, "is_trial": is_trial, "user_name": user_name,
+                        "token": issue_pg_token(user, tier, is_trial, expires_at)})
 
     elif action == "register":
         # IP 기반 rate limit: 1시간에 3회
@@ -1742,8 +3486,7 @@ def api_profitguard():
         if client_ip and "," in client_ip:
             client_ip = client_ip.split(",")[0].strip()
         reg_key = f"pg_register:{client_ip}"
-        reg_count = cache.get(reg_key) or 0
-        if reg_count >= 3:
+        if (cache.get(reg_key) or 0) >= 3:
             return jsonify({"result": "FAIL", "msg": "잠시 후 다시 시도해주세요. (가입 횟수 제한)"})
 
         email = (data.get("email") or "").strip().lower()
@@ -1772,7 +3515,7 @@ def api_profitguard():
 
             email=email,
 
-            pw_hash=generate_password_hash(password),
+            pw_hash=hash_password(password),
 
             nickname=name,
 
@@ -1784,12 +3527,14 @@ def api_profitguard():
 
         )
 
+        # 공유 캐시 카운터로 슬롯 확보 (워커가 여러 개여도 IP당 3회)
+        if cache_incr(reg_key, timeout=3600) > 3:
+            return jsonify({"result": "FAIL", "msg": "잠시 후 다시 시도해주세요. (가입 횟수 제한)"})
+
         db.session.add(u)
 
         db.session.commit()
 
-        cache.set(reg_key, reg_count + 1, timeout=3600)
-
         return jsonify({"result": "SUCCESS", "msg": "체험판 계정이 생성되었습니다."})
 
 
@@ -1806,7 +3551,7 @@ def api_profitguard():
 
         user = User.query.filter_by(email=email).first()
 
-        if not user or not check_password_hash(user.pw_hash, password):
+        if not user or not verify_password(user.pw_hash, password):
 
             return jsonify({"result": "FAIL", "msg": "이메일 또는 비밀번호가 틀렸습니다."})
 
@@ -1828,6 +3573,8 @@ def api_profitguard():
 
         user.profitguard_hwid_changed_at = datetime.utcnow()
 
+        revoke_pg_tokens(user.id)
+
         db.session.commit()
 
         return jsonify({"result": "SUCCESS", "msg": "기기가 변경되었습니다. 다시 로그인해주세요."})
@@ -1838,6 +3585,67 @@ def api_profitguard():
 
 
 
+# ============ 프로핏가드 하트비트 ============
+# 클라이언트가 주기적으로 등급/만료를 확인하는 경량 엔드포인트
+# 유효한 토큰은 DB 조회 없이 응답하고, ETag가 같으면 304.
+# max-age는 토큰(=구독/체험) 만료까지 남은 시간을 넘지 않아 만료 직후 바로 재확인됨
+def _pg_heartbeat(token, hwid=""):
+    """토큰 하나의 상태 -> dict (result: OK / EXPIRED / TOKEN_EXPIRED / DEVICE_ERROR)"""
+    claims = verify_pg_token(token, allow_expired=True)
+    if not claims:
+        return {"result": "TOKEN_EXPIRED"}
+    if hwid and claims.get("hwid") and claims["hwid"] != hwid:
+        return {"result": "DEVICE_ERROR"}
+    if claims["exp"] > time.time():
+        return {"result": "OK", "tier": claims["tier"], "is_trial": claims["trial"], "exp": claims["exp"]}
+
+    # 만료: DB에서 재평가 (갱신 결제 반영 또는 체험 종료 통보)
+    user = db.session.get(User, claims["uid"])
+    if not user or user.email != claims.get("email"):
+        return {"result": "TOKEN_EXPIRED"}
+    tier, is_trial, expires_at = get_pg_tier(user)
+    if tier == "FREE":
+        return {"result": "EXPIRED", "tier": "FREE",
+                "msg": "구독 중인 프로핏가드 플랜이 없습니다.\nmoneying.biz에서 구독 후 이용해주세요."}
+    new_token = issue_pg_token(user, tier, is_trial, expires_at)
+    return {"result": "OK", "tier": tier, "is_trial": is_trial,
+            "exp": verify_pg_token(new_token)["exp"], "token": new_token}
+
+
+@app.route("/api/profitguard/heartbeat", methods=["GET", "POST"])
+def api_profitguard_heartbeat():
+    """GET: Authorization: Bearer <token> (+ X-PG-HWID) -> 상태, ETag/304 지원
+    POST: {"tokens": [토큰 또는 {"token", "hwid"}, ...]} 여러 토큰 일괄 확인 (최대 100개)"""
+    if request.method == "POST":
+        tokens = (request.get_json(silent=True) or {}).get("tokens") or []
+        if not isinstance(tokens, list) or len(tokens) > 100:
+            return jsonify({"result": "FAIL", "msg": "tokens는 최대 100개입니다."}), 400
+        results = [
+            _pg_heartbeat(str(t.get("token", "")), t.get("hwid", "")) if isinstance(t, dict) else _pg_heartbeat(str(t))
+            for t in tokens
+        ]
+        resp = make_response(jsonify({"results": results}))
+        resp.headers["Cache-Control"] = "no-store"
+        return resp
+
+    auth = request.headers.get("Authorization", "")
+    # 토큰은 헤더로만 받음 (쿼리스트링은 접근 로그/프록시에 남음)
+    token = auth[7:].strip() if auth.startswith("Bearer ") else ""
+    hwid = request.headers.get("X-PG-HWID") or request.args.get("hwid", "")
+    status = _pg_heartbeat(token, hwid)
+
+    resp = make_response(jsonify(status), 200 if status["result"] in ("OK", "EXPIRED") else 401)
+    if status["result"] != "OK" or "token" in status:
+        # 실패 또는 새 토큰 발급 응답은 캐시하지 않음
+        resp.headers["Cache-Control"] = "no-store"
+        return resp
+    resp.headers["Cache-Control"] = f"private, max-age={max(0, min(PG_HEARTBEAT_MAX_AGE, int(status['exp'] - time.time())))}"
+    resp.headers["Vary"] = "Authorization"
+    resp.set_etag(hashlib.sha1(f"{status['tier']}:{status['is_trial']}:{status['exp']}".encode()).hexdigest()[:16])
+    return resp.make_conditional(request)
+
+
+
 # ============ 스토어 결제 ============
 
 @app.route("/store/checkout/<int:product_id>")
@@ -1996,10 +3804,106 @@ def gallery():
         except:
             session["is_seller"] = False
     
-    categories = Category.query.filter_by(is_active=True).order_by(Category.sort_order).all()
-    return render_template("gallery.html", posts=[p.to_dict() for p in posts], categories=categories)
+    return render_template("gallery.html", posts=[p.to_dict() for p in posts], categories=category_registry.active(),
+                           category_counts=get_gallery_category_counts())
+
+def _bump_category_count(connection, category, delta):
+    res = connection.execute(
+        db.update(CommunityCategoryCount)
+        .where(CommunityCategoryCount.category == category)
+        .values(post_count=CommunityCategoryCount.post_count + delta)
+    )
+    if res.rowcount == 0:
+        connection.execute(db.insert(CommunityCategoryCount).values(category=category, post_count=max(delta, 0)))
+
+
+@event.listens_for(CommunityPost, "after_insert")
+def _community_post_inserted(mapper, connection, target):
+    _bump_category_count(connection, target.category or "free", 1)
+    object_session(target).info["community_counts_dirty"] = True
+
+
+@event.listens_for(CommunityPost, "after_delete")
+def _community_post_deleted(mapper, connection, target):
+    _bump_category_count(connection, target.category or "free", -1)
+    object_session(target).info["community_counts_dirty"] = True
+
+
+@event.listens_for(CommunityPost, "after_update")
+def _community_post_updated(mapper, connection, target):
+    hist = inspect(target).attrs.category.history
+    if hist.has_changes() and hist.deleted:
+        _bump_category_count(connection, hist.deleted[0] or "free", -1)
+        _bump_category_count(connection, target.category or "free", 1)
+        object_session(target).info["community_counts_dirty"] = True
+
+
+@event.listens_for(db.session, "after_commit")
+def _community_counts_committed(sess):
+    if sess.info.pop("community_counts_dirty", None):
+        cache.delete("community:counts")
+
+
+def seed_community_category_counts():
+    """카운트 테이블이 비어 있으면 현재 게시글로 초기화"""
+    if CommunityCategoryCount.query.first():
+        return
+    for category, cnt in db.session.query(CommunityPost.category, db.func.count(CommunityPost.id)).group_by(CommunityPost.category).all():
+        db.session.add(CommunityCategoryCount(category=category or "free", post_count=cnt))
+    db.session.commit()
+
+
+def get_community_counts():
+    """{카테고리: 게시글 수} (30초 캐시)"""
+    counts = cache.get("community:counts")
+    if counts is None:
+        counts = {c: n for c, n in db.session.query(CommunityCategoryCount.category, CommunityCategoryCount.post_count).all()}
+        cache.set("community:counts", counts, timeout=30)
+    return counts
+
+
+def count_community_search(query, cache_key):
+    """검색 결과 수: COMMUNITY_SEARCH_COUNT_CAP에서 멈추는 COUNT + 60초 캐시 -> (수, 상한 도달 여부)"""
+    key = "community:search_count:" + hashlib.sha1(cache_key.encode()).hexdigest()
+    cached = cache.get(key)
+    if cached is None:
+        sub = query.with_entities(CommunityPost.id).order_by(None).limit(COMMUNITY_SEARCH_COUNT_CAP + 1).subquery()
+        n = db.session.query(db.func.count()).select_from(sub).scalar() or 0
+        cached = (min(n, COMMUNITY_SEARCH_COUNT_CAP), n > COMMUNITY_SEARCH_COUNT_CAP)
+        cache.set(key, cached, timeout=60)
+    return cached
+
+
+def get_popular_community_posts(category=None):
+    """인기글 Top N. 순위(id 목록)만 60초 캐시하고 글은 매번 id로 조회"""
+    key = f"community:popular:{category or 'all'}"
+    ids = cache.get(key)
+    if ids is None:
+        def top(q, limit, exclude):
+            if category:
+                q = q.filter(CommunityPost.category == category)
+            if exclude:
+                q = q.filter(~CommunityPost.id.in_(exclude))
+            return [i for (i,) in q.limit(limit).all()]
+
+        base = db.session.query(CommunityPost.id)
+        since = datetime.utcnow() - timedelta(days=COMMUNITY_POPULAR_DAYS)
+        ids = top(base.filter(CommunityPost.created_at >= since, CommunityPost.like_count > 0)
+                  .order_by(CommunityPost.like_count.desc(), CommunityPost.id.desc()), COMMUNITY_POPULAR_SIZE, [])
+        if len(ids) < COMMUNITY_POPULAR_SIZE:
+            ids += top(base.filter(CommunityPost.like_count > 0)
+                       .order_by(CommunityPost.like_count.desc(), CommunityPost.id.desc()), COMMUNITY_POPULAR_SIZE - len(ids), ids)
+        if len(ids) < COMMUNITY_POPULAR_SIZE:
+            ids += top(base.order_by(CommunityPost.id.desc()), COMMUNITY_POPULAR_SIZE - len(ids), ids)
+        cache.set(key, ids, timeout=60)
+    if not ids:
+        return []
+    posts = {p.id: p for p in CommunityPost.query.filter(CommunityPost.id.in_(ids)).all()}
+    return [posts[i] for i in ids if i in posts]
+
 
 @app.route("/community")
+@anonymous_page_cache(timeout=tagged_ttl(300, 30), tags=("community",))
 def community_page():
     search = request.args.get("q", "").strip()
     cat = request.args.get("cat", "all").strip()
@@ -2018,54 +3922,141 @@ def community_page():
     if cat and cat != "all":
         query = query.filter(CommunityPost.category == cat)
 
-    total = query.count()
+    # 전체 COUNT 대신: 카테고리 보기는 유지 중인 카운트, 검색은 상한 있는 캐시 카운트
+    total_capped = False
+    if search:
+        total, total_capped = count_community_search(query, f"{cat}|{search}")
+    elif cat and cat != "all":
+        total = get_community_counts().get(cat, 0)
+    else:
+        total = sum(get_community_counts().values())
     total_pages = max(1, (total + per_page - 1) // per_page)
     page = max(1, min(page, total_pages))
     posts = query.offset((page - 1) * per_page).limit(per_page).all()
 
-    # 인기글 Top 3 (좋아요 기준, 항상 전체에서)
-    popular_sub = db.session.query(
-        CommunityLike.post_id, db.func.count(CommunityLike.id).label("cnt")
-    ).group_by(CommunityLike.post_id).subquery()
-    popular_posts = db.session.query(CommunityPost).join(
-        popular_sub, CommunityPost.id == popular_sub.c.post_id
-    ).order_by(popular_sub.c.cnt.desc()).limit(3).all()
-    if len(popular_posts) < 3:
-        existing_ids = [p.id for p in popular_posts]
-        fill = CommunityPost.query.filter(~CommunityPost.id.in_(existing_ids)).order_by(CommunityPost.id.desc()).limit(3 - len(popular_posts)).all()
-        popular_posts += fill
-
-    # N+1 해결: 좋아요 수 일괄 조회 (게시글 + 인기글 합산)
-    all_ids = list(set([p.id for p in posts] + [p.id for p in popular_posts]))
-    post_likes = {}
-    if all_ids:
-        likes_data = db.session.query(
-            CommunityLike.post_id, db.func.count(CommunityLike.id)
-        ).filter(CommunityLike.post_id.in_(all_ids)).group_by(CommunityLike.post_id).all()
-        post_likes = {pid: cnt for pid, cnt in likes_data}
-
-    return render_template("community.html", posts=posts, popular_posts=popular_posts, post_likes=post_likes, now=datetime.utcnow(),
-                           search=search, cat=cat, page=page, total_pages=total_pages, total=total)
+    # 인기글 (캐시된 좋아요 순위, 좋아요 수는 like_count 컬럼)
+    popular_posts = get_popular_community_posts(cat if cat and cat != "all" else None)
+    prime_nicknames([p.author_email for p in posts] + [p.author_email for p in popular_posts])
+
+    return render_template("community.html", posts=posts, popular_posts=popular_posts, now=datetime.utcnow(),
+                           search=search, cat=cat, page=page, total_pages=total_pages, total=total, total_capped=total_capped)
+
+def _bump_comment_count(connection, post_id, delta):
+    connection.execute(
+        db.update(CommunityPost)
+        .where(CommunityPost.id == post_id)
+        .values(comment_count=CommunityPost.comment_count + delta)
+    )
+
+
+@event.listens_for(CommunityComment, "after_insert")
+def _community_comment_inserted(mapper, connection, target):
+    _bump_comment_count(connection, target.post_id, 1)
+
+
+@event.listens_for(CommunityComment, "after_delete")
+def _community_comment_deleted(mapper, connection, target):
+    _bump_comment_count(connection, target.post_id, -1)
+
+
+@event.listens_for(CommunityComment, "after_insert")
+@event.listens_for(CommunityComment, "after_update")
+@event.listens_for(CommunityComment, "after_delete")
+def _community_comment_changed(mapper, connection, target):
+    object_session(target).info.setdefault("community_comments_dirty", set()).add(target.post_id)
+
+
+@event.listens_for(db.session, "after_commit")
+def _community_comments_committed(sess):
+    for post_id in sess.info.pop("community_comments_dirty", ()):
+        cache.delete(f"community:comments:{post_id}")
+
+
+@event.listens_for(db.session, "after_rollback")
+def _community_comments_rolled_back(sess):
+    sess.info.pop("community_comments_dirty", None)
+
+
+def load_community_comments(post_id, after_id=0, limit=None):
+    """댓글 한 페이지 (id 커서, 닉네임 조인) -> (comments, nicknames, 다음 커서 또는 None)"""
+    limit = limit or COMMUNITY_COMMENTS_PAGE
+    rows = (db.session.query(CommunityComment, User.nickname)
+            .outerjoin(User, User.email == CommunityComment.author_email)
+            .filter(CommunityComment.post_id == post_id, CommunityComment.id > after_id)
+            .order_by(CommunityComment.id).limit(limit + 1).all())
+    next_cursor = rows[limit - 1][0].id if len(rows) > limit else None
+    comments, nicknames = [], {}
+    for c, n in rows[:limit]:
+        comments.append(c)
+        nicknames.setdefault(c.author_email, _display_name(c.author_email, n))
+    return comments, nicknames, next_cursor
+
+
+def load_community_detail(post_id, user_email=None, user_id=None, with_comments=True):
+    """게시글 상세 일괄 조회: 글+작성자 닉네임+좋아요/신청 여부+승인 수 1쿼리, 댓글 첫 페이지+닉네임 1쿼리
+    -> (post, comments, nicknames, next_cursor, user_liked, deal_apply_count, user_applied), 글이 없으면 None"""
+    author_nick = db.select(User.nickname).where(User.email == CommunityPost.author_email).limit(1).scalar_subquery()
+    approved = (db.select(db.func.count(DealApplication.id))
+                .where(DealApplication.post_id == CommunityPost.id, DealApplication.status == "approved")
+                .scalar_subquery())
+    liked = db.exists().where(CommunityLike.post_id == CommunityPost.id, CommunityLike.user_email == user_email)
+    applied = db.exists().where(DealApplication.post_id == CommunityPost.id, DealApplication.user_id == user_id)
+    row = (db.session.query(CommunityPost, author_nick, approved, liked, applied)
+           .filter(CommunityPost.id == post_id).first())
+    if row is None:
+        return None
+    post, nick, approved_cnt, user_liked, user_applied = row
+
+    comments, nicknames, next_cursor = [], {}, None
+    if with_comments:
+        comments, nicknames, next_cursor = load_community_comments(post_id)
+    nicknames[post.author_email] = _display_name(post.author_email, nick)
+
+    is_deal = post.category == "deal"
+    return (post, comments, nicknames, next_cursor, bool(user_email) and bool(user_liked),
+            (approved_cnt or 0) if is_deal else 0, bool(user_id) and is_deal and bool(user_applied))
+
 
 @app.route("/community/<int:post_id>")
 def community_detail(post_id):
-    post = CommunityPost.query.get_or_404(post_id)
-    
-    if not session.get("user_id") and not is_admin():
+    anonymous = not session.get("user_id") and not is_admin()
+    # 비로그인 화면의 댓글 목록은 수정/삭제 버튼이 없으므로 글 단위로 HTML 조각을 캐시
+    fragment = cache.get(f"community:comments:{post_id}") if anonymous else None
+    loaded = load_community_detail(post_id, session.get("user_email"), session.get("user_id"),
+                                   with_comments=fragment is None)
+    if loaded is None:
+        abort(404)
+    post, comments, nicknames, next_cursor, user_liked, deal_apply_count, user_applied = loaded
+
+    if anonymous:
         if post.category not in ['free', 'revenue']:
             flash("로그인 후 이용 가능합니다.", "error")
             return redirect(url_for("login", next=f"/community/{post_id}"))
-    
-    comments = CommunityComment.query.filter_by(post_id=post_id).order_by(CommunityComment.created_at).all()
-    like_count = CommunityLike.query.filter_by(post_id=post_id).count()
-    user_liked = False
-    if session.get("user_email"):
-        user_liked = CommunityLike.query.filter_by(post_id=post_id, user_email=session.get("user_email")).first() is not None
-    deal_apply_count = DealApplication.query.filter_by(post_id=post_id, status="approved").count() if post.category == "deal" else 0
-
-    user_applied = DealApplication.query.filter_by(post_id=post_id, user_id=session.get("user_id")).first() is not None if session.get("user_id") and post.category == "deal" else False
 
-    return render_template("community_detail.html", post=post, comments=comments, like_count=like_count, user_liked=user_liked, now=datetime.utcnow(), deal_apply_count=deal_apply_count, user_applied=user_applied)
+    if fragment is None:
+        fragment = (render_template("partials/community_comments.html", comments=comments, nicknames=nicknames), next_cursor)
+        if anonymous:
+            cache.set(f"community:comments:{post_id}", fragment, timeout=COMMUNITY_COMMENTS_CACHE_TTL)
+    comments_html, next_cursor = fragment
+
+    return render_template("community_detail.html", post=post, comment_count=post.comment_count or 0,
+                           comments_html=comments_html, comments_next=next_cursor,
+                           author_nickname=nicknames[post.author_email], like_count=post.like_count or 0,
+                           user_liked=user_liked, now=datetime.utcnow(), deal_apply_count=deal_apply_count, user_applied=user_applied)
+
+@app.route("/community/<int:post_id>/comments")
+def community_comments_api(post_id):
+    """댓글 "더보기": ?after=<마지막 댓글 id> 이후 한 페이지를 HTML 조각으로 반환"""
+    category = db.session.query(CommunityPost.category).filter(CommunityPost.id == post_id).scalar()
+    if category is None:
+        return jsonify({"ok": False, "error": "not found"}), 404
+    if not session.get("user_id") and not is_admin() and category not in ['free', 'revenue']:
+        return jsonify({"ok": False, "error": "login required"}), 401
+    after = request.args.get("after", 0, type=int)
+    limit = min(max(request.args.get("limit", COMMUNITY_COMMENTS_PAGE, type=int), 1), 100)
+    comments, nicknames, next_cursor = load_community_comments(post_id, after, limit)
+    html = render_template("partials/community_comments.html", comments=comments, nicknames=nicknames)
+    return jsonify({"ok": True, "html": html, "count": len(comments), "next": next_cursor})
 
 @app.route("/community/<int:post_id>/delete", methods=["POST"])
 def community_delete(post_id):
@@ -2078,6 +4069,7 @@ def community_delete(post_id):
     CommunityLike.query.filter_by(post_id=post_id).delete()
     db.session.delete(post)
     db.session.commit()
+    cache.delete(f"community:comments:{post_id}")
     return redirect(url_for("community_page"))
 
 
@@ -2253,21 +4245,43 @@ def community_like(post_id):
 
     existing = CommunityLike.query.filter_by(post_id=post_id, user_email=user_email).first()
 
+    mark_cache_tags("community")
+
     if existing:
 
-        db.session.delete(existing)
+        # 동시 취소 요청이 둘 다 감소시키지 않도록 실제로 지운 경우에만 -1
+
+        if db.session.execute(db.delete(CommunityLike).where(CommunityLike.id == existing.id)).rowcount:
+
+            db.session.execute(db.update(CommunityPost).where(CommunityPost.id == post_id)
+
+                               .values(like_count=CommunityPost.like_count - 1))
 
         liked = False
 
     else:
 
-        db.session.add(CommunityLike(post_id=post_id, user_email=user_email))
+        try:
+
+            db.session.add(CommunityLike(post_id=post_id, user_email=user_email))
+
+            db.session.flush()
+
+            db.session.execute(db.update(CommunityPost).where(CommunityPost.id == post_id)
+
+                               .values(like_count=CommunityPost.like_count + 1))
+
+        except IntegrityError:
+
+            # 동시 요청으로 이미 좋아요가 들어간 경우 (unique 제약)
+
+            db.session.rollback()
 
         liked = True
 
     db.session.commit()
 
-    count = CommunityLike.query.filter_by(post_id=post_id).count()
+    count = db.session.query(CommunityPost.like_count).filter(CommunityPost.id == post_id).scalar() or 0
 
     return jsonify({"liked": liked, "count": count})
 
@@ -2544,8 +4558,6 @@ def link_request_new():
         original_url = (request.form.get("original_url") or "").strip()
         form_data = {"title": title, "original_url": original_url, "kakao_nickname": kakao_nickname}
 
-        # 한도 재확인 (race condition 방지)
-        monthly_used = get_monthly_link_request_count(user_email)
         if monthly_used >= monthly_limit:
             flash(f"이번 달 링크요청 한도({monthly_limit}회)를 초과했습니다.", "error")
             return redirect(url_for("link_requests"))
@@ -2577,8 +4589,9 @@ def link_request_new():
             items = LinkRequest.query.filter_by(requester_email=user_email).order_by(LinkRequest.id.desc()).limit(10).all()
             return render_template("link_request_new.html", monthly_used=monthly_used, monthly_limit=monthly_limit, items=items, form_data=form_data)
 
-        # 중복 요청 체크 (같은 URL로 대기중인 요청)
-        existing = LinkRequest.query.filter_by(requester_email=user_email, original_url=original_url).filter(
+        # 중복 요청 체크 (정규화 URL이 같은 대기중인 요청)
+        canonical_hash = canonical_url_hash(original_url)
+        existing = LinkRequest.query.filter_by(requester_email=user_email, canonical_hash=canonical_hash).filter(
             (LinkRequest.coupang_url == None) | (LinkRequest.coupang_url == "")
         ).first()
         if existing:
@@ -2590,11 +4603,22 @@ def link_request_new():
         import re
         title = re.sub(r"<[^>]+>", "", title).strip()[:200]
 
+        # 쿼터 선점과 요청 insert를 한 트랜잭션으로 (동시 요청이 몰려도 한도 초과 없음)
+        if not claim_link_request_quota(user_email, monthly_limit):
+            db.session.rollback()
+            flash(f"이번 달 링크요청 한도({monthly_limit}회)를 초과했습니다.", "error")
+            return redirect(url_for("link_requests"))
+        # 같은 상품이 이미 변환돼 있으면 대기열을 거치지 않고 바로 완료
+        coupang_url = find_fulfilled_link(canonical_hash)
         db.session.add(LinkRequest(
             title=title, original_url=original_url,
+            canonical_hash=canonical_hash, canonical_version=LINK_HASH_VERSION,
+            coupang_url=coupang_url or "",
             requester_email=user_email, kakao_nickname=kakao_nickname
         ))
         db.session.commit()
+        if coupang_url:
+            flash("이미 등록된 상품이라 쿠팡 링크가 바로 발급되었습니다!", "success")
         return redirect(url_for("my_link_requests", success=1))
 
     items = LinkRequest.query.filter_by(requester_email=user_email).order_by(LinkRequest.id.desc()).limit(10).all() if user_email else []
@@ -2658,21 +4682,9 @@ def link_request_detail(request_id):
         if coupang_url and not coupang_url.startswith(("http://", "https://")):
             flash("올바른 URL을 입력해주세요.", "error")
             return render_template("link_request_detail.html", it=it)
-        it.coupang_url = coupang_url
-        db.session.commit()
-
-        if it.coupang_url:
-            user = User.query.filter_by(email=it.requester_email).first()
-            if user:
-                db.session.add(Notification(
-                    user_id=user.id,
-                    type="link_completed",
-                    title="링크요청 완료",
-                    message=f"'{it.title}' 요청의 쿠팡 링크가 등록되었습니다!",
-                    link=f"/link-requests/{it.id}"
-                ))
-                db.session.commit()
-
+        siblings = fulfill_link_request(it, coupang_url)
+        if siblings:
+            flash(f"같은 상품의 대기중인 요청 {siblings}건도 함께 완료했습니다.", "success")
         return redirect(url_for("admin_link_requests"))
     return render_template("link_request_detail.html", it=it)
 
@@ -2706,20 +4718,17 @@ def register():
                 referred_by_id = referrer.id
         
         phone = (request.form.get("phone") or "").strip().replace("-", "")
-        u = User(email=email, pw_hash=generate_password_hash(password), referred_by=referred_by_id, phone=phone)
+        u = User(email=email, pw_hash=hash_password(password), referred_by=referred_by_id, phone=phone)
         db.session.add(u)
+        if phone:
+            send_welcome_alimtalk(phone)
         db.session.commit()
-        
+
         session.clear()
         session["user_id"] = u.id
         session["user_email"] = u.email
         session["subscriber"] = False
         session["is_trial"] = False
-        try:
-            if u.phone:
-                send_welcome_alimtalk(u.phone)
-        except Exception as e:
-            print(f"[알림톡] 가입환영 발송 오류: {e}")
         return redirect(url_for("index"))
 
 
@@ -2803,6 +4812,8 @@ def kakao_callback():
     if profile_image and not user.profile_photo:
         user.profile_photo = profile_image
     db.session.commit()
+    if is_new_user:
+        nickname_cache.invalidate(email)
     
     new_token = secrets.token_hex(32)
 
@@ -2922,7 +4933,7 @@ def login():
                 u.login_fail_count = 0
                 db.session.commit()
         
-        if not u or not check_password_hash(u.pw_hash, password):
+        if not u or not verify_and_upgrade_password(u, password):
             if u:
                 u.login_fail_count = (u.login_fail_count or 0) + 1
                 if u.login_fail_count >= 5:
@@ -2968,8 +4979,9 @@ def forgot_password():
         import random
         import string
         temp_pw = ''.join(random.choices(string.ascii_letters + string.digits, k=8))
-        user.pw_hash = generate_password_hash(temp_pw)
+        user.pw_hash = hash_password(temp_pw)
         user.pg_api_token = None
+        revoke_pg_tokens(user.id)
         db.session.commit()
         
         html_body = f"""
@@ -3032,7 +5044,7 @@ def change_password():
         # 카카오 유저(비번 미설정)는 현재 비밀번호 검증 스킵
         if not is_kakao_no_pw:
             current_pw = (request.form.get("current_password") or "").strip()
-            if not check_password_hash(user.pw_hash, current_pw):
+            if not verify_password(user.pw_hash, current_pw):
                 flash("현재 비밀번호가 올바르지 않습니다.", "error")
                 return redirect(url_for("change_password"))
 
@@ -3044,9 +5056,10 @@ def change_password():
             flash("새 비밀번호가 일치하지 않습니다.", "error")
             return redirect(url_for("change_password"))
 
-        user.pw_hash = generate_password_hash(new_pw)
+        user.pw_hash = hash_password(new_pw)
         user.pg_password_set = True
         user.pg_api_token = None
+        revoke_pg_tokens(user.id)
         # 세션 토큰 갱신 (다른 기기 로그아웃)
         new_token = secrets.token_hex(32)
         user.session_token = new_token
@@ -3524,46 +5537,175 @@ def api_gallery_view(post_id):
 # ----------------------------
 # Admin Gallery
 # ----------------------------
-@app.route("/admin/gallery")
-def admin_gallery():
-    if not is_admin():
-        return redirect(url_for("admin_login"))
-    posts = Post.query.filter(Post.is_deleted != True).order_by(Post.id.desc()).all()
+ADMIN_GALLERY_PAGE = 50
+ADMIN_BULK_CHUNK = 1000
+ADMIN_GALLERY_COUNT_CAP = 10000
+ADMIN_GALLERY_FILTERS = ("category", "status", "uploader", "featured", "date_from", "date_to", "q")
+FEATURED_MAX = 4
+
+
+def admin_gallery_query(filters, deleted=False):
+    """관리자 갤러리/휴지통 목록 쿼리 (필터: category, status, uploader, featured, date_from, date_to, q)"""
+    query = Post.query.filter(Post.is_deleted == True) if deleted else Post.query.filter(Post.is_deleted != True)
+    if filters.get("category"):
+        query = query.filter(Post.category == filters["category"])
+    status = filters.get("status")
+    if status == "approved":
+        query = query.filter((Post.status == "approved") | (Post.status == None) | (Post.status == ""))
+    elif status:
+        query = query.filter(Post.status == status)
+    if str(filters.get("uploader") or "").isdigit():
+        query = query.filter(Post.uploaded_by == int(filters["uploader"]))
+    if filters.get("featured") == "1":
+        query = query.filter(Post.is_featured == True)
+    elif filters.get("featured") == "0":
+        query = query.filter(Post.is_featured != True)
+    for key, op in (("date_from", "__ge__"), ("date_to", "__lt__")):
+        try:
+            day = datetime.strptime(filters.get(key) or "", "%Y-%m-%d")
+        except ValueError:
+            continue
+        query = query.filter(getattr(Post.created_at, op)(day + timedelta(days=1) if key == "date_to" else day))
+    if filters.get("q"):
+        query = query.filter(Post.title.ilike(f"%{filters['q']}%"))
+    return query
+
+
+def _admin_gallery_page(query, before):
+    """id 내림차순 키셋 페이지 -> (posts, 다음 커서 또는 None)"""
+    if before:
+        query = query.filter(Post.id < before)
+    rows = query.order_by(Post.id.desc()).limit(ADMIN_GALLERY_PAGE + 1).all()
+    next_cursor = rows[ADMIN_GALLERY_PAGE - 1].id if len(rows) > ADMIN_GALLERY_PAGE else None
+    return rows[:ADMIN_GALLERY_PAGE], next_cursor
+
+
+def _capped_count(query, cap, id_col=Post.id):
+    sub = query.with_entities(id_col).order_by(None).limit(cap + 1).subquery()
+    n = db.session.query(db.func.count()).select_from(sub).scalar() or 0
+    return min(n, cap), n > cap
+
+
+def _admin_gallery_uploaders():
+    """업로더 필터 목록 [(id, 이름)] ("post" 태그로 무효화)"""
+    key = "admin:gallery_uploaders#" + cache_tag_versions(["post"])
+    uploaders = cache.get(key)
+    if uploaders is None:
+        ids = db.session.query(Post.uploaded_by).filter(Post.uploaded_by != None).distinct()
+        uploaders = [(u.id, u.nickname or u.email) for u in
+                     User.query.filter(User.id.in_(ids)).order_by(User.id).all()]
+        cache.set(key, uploaders, timeout=tagged_ttl(600, 60))
+    return uploaders
+
+
+def _iter_post_id_chunks(query, size=ADMIN_BULK_CHUNK):
+    """쿼리에 걸리는 Post id를 size개씩 (id 내림차순 키셋, 갱신 중에도 중복/누락 없음)"""
+    last = None
+    while True:
+        q = query.with_entities(Post.id).order_by(Post.id.desc())
+        if last is not None:
+            q = q.filter(Post.id < last)
+        ids = [i for (i,) in q.limit(size).all()]
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def bulk_update_posts(id_chunks, values):
+    """id 묶음마다 UPDATE 1번 + 커밋 (긴 트랜잭션/락 방지) -> 갱신 행 수"""
+    total = 0
+    for ids in id_chunks:
+        total += Post.query.filter(Post.id.in_(ids)).update(values, synchronize_session=False)
+        mark_cache_tags("post")
+        db.session.commit()
+    return total
 
-    # 업로더/판매자 정보를 한 번에 조회 (N+1 방지)
-    uploader_ids = set()
-    for p in posts:
-        if p.uploaded_by:
-            uploader_ids.add(p.uploaded_by)
-        if p.seller_id:
-            uploader_ids.add(p.seller_id)
-    uploaders = {}
-    if uploader_ids:
-        for u in User.query.filter(User.id.in_(uploader_ids)).all():
-            uploaders[u.id] = u.nickname or u.email
 
-    categories = Category.query.filter(
+def _render_admin_gallery(template, deleted):
+    filters = {k: (request.args.get(k) or "").strip() for k in ADMIN_GALLERY_FILTERS}
+    query = admin_gallery_query(filters, deleted=deleted)
+    before = request.args.get("before", type=int)
+    posts, next_cursor = _admin_gallery_page(query, before)
+    total, total_capped = _capped_count(query, ADMIN_GALLERY_COUNT_CAP)
 
-        Category.is_active == True,
+    # 현재 페이지 업로더/판매자 이름만 한 번에 조회
+    user_ids = {p.uploaded_by for p in posts if p.uploaded_by} | {p.seller_id for p in posts if p.seller_id}
+    names = {}
+    if user_ids:
+        names = {u.id: u.nickname or u.email for u in User.query.filter(User.id.in_(user_ids)).all()}
 
-        Category.key.notin_(['all', 'bookmark', 'recent'])
+    return render_template(template, posts=posts, uploaders=names, uploader_options=_admin_gallery_uploaders(),
+                           categories=category_registry.active(exclude=CATEGORY_HIDDEN_KEYS),
+                           filters=filters, active_filters={k: v for k, v in filters.items() if v},
+                           before=before, next_cursor=next_cursor, total=total, total_capped=total_capped)
 
-    ).order_by(Category.sort_order).all()
 
-    return render_template("admin_gallery.html", posts=posts, uploaders=uploaders, categories=categories)
+@app.route("/admin/gallery")
+def admin_gallery():
+    if not is_admin():
+        return redirect(url_for("admin_login"))
+    return _render_admin_gallery("admin_gallery.html", deleted=False)
 
 
 @app.route("/admin/gallery/trash")
-
 def admin_gallery_trash():
-
     if not is_admin():
-
         return redirect(url_for("admin_login"))
+    return _render_admin_gallery("admin_gallery_trash.html", deleted=True)
 
-    posts = Post.query.filter_by(is_deleted=True).order_by(Post.id.desc()).all()
 
-    return render_template("admin_gallery_trash.html", posts=posts)
+@app.route("/admin/gallery/bulk-action", methods=["POST"])
+def admin_gallery_bulk_action():
+    """선택 id 또는 필터 결과 전체에 restore/delete/feature/unfeature/categorize를 묶음 UPDATE로 적용.
+    body: {action, ids: [...]} 또는 {action, all_matching: true, filters: {...}, trash: bool}, categorize는 category 필요"""
+    if not is_admin():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    data = request.get_json() or {}
+    action = data.get("action")
+    values = {
+        "restore": {"is_deleted": False},
+        "delete": {"is_deleted": True},
+        "feature": {"is_featured": True},
+        "unfeature": {"is_featured": False},
+    }.get(action)
+    if action == "categorize":
+        category = (data.get("category") or "").strip()
+        if category not in {c.key for c in category_registry.all()}:
+            return jsonify({"ok": False, "error": "알 수 없는 카테고리입니다."}), 400
+        values = {"category": category}
+    if values is None:
+        return jsonify({"ok": False, "error": "알 수 없는 작업입니다."}), 400
+
+    if data.get("all_matching"):
+        query = admin_gallery_query(data.get("filters") or {}, deleted=bool(data.get("trash")))
+    else:
+        try:
+            ids = sorted({int(i) for i in data.get("ids") or []}, reverse=True)
+        except (TypeError, ValueError):
+            return jsonify({"ok": False, "error": "잘못된 id"}), 400
+        if not ids:
+            return jsonify({"ok": False, "error": "선택된 항목이 없습니다."}), 400
+        query = Post.query.filter(Post.id.in_(ids))
+
+    if action == "feature":
+        # 메인 추천은 최대 FEATURED_MAX개 (삭제되지 않은 글만)
+        query = query.filter(Post.is_deleted != True, Post.is_featured != True)
+        adding, _ = _capped_count(query, FEATURED_MAX + 1)
+        current = Post.query.filter_by(is_featured=True).count()
+        if current + adding > FEATURED_MAX:
+            return jsonify({"ok": False, "error": "max",
+                            "msg": f"메인 추천은 최대 {FEATURED_MAX}개입니다. (현재 {current}개)"}), 400
+
+    if data.get("all_matching"):
+        chunks = _iter_post_id_chunks(query)
+    else:
+        chunks = (ids[i:i + ADMIN_BULK_CHUNK] for i in range(0, len(ids), ADMIN_BULK_CHUNK))
+        if action == "feature":
+            chunks = [[i for (i,) in query.with_entities(Post.id).all()]]
+    count = bulk_update_posts(chunks, values)
+    print(f"[ADMIN] 갤러리 일괄 {action}: {count}건")
+    return jsonify({"ok": True, "count": count})
 
 
 
@@ -3595,9 +5737,7 @@ def admin_gallery_restore_all():
 
         return redirect(url_for("admin_login"))
 
-    Post.query.filter_by(is_deleted=True).update({"is_deleted": False})
-
-    db.session.commit()
+    bulk_update_posts(_iter_post_id_chunks(Post.query.filter_by(is_deleted=True)), {"is_deleted": False})
 
     flash("\uc804\uccb4 \ubcf5\uc6d0\ub418\uc5c8\uc2b5\ub2c8\ub2e4.", "success")
 
@@ -3619,9 +5759,8 @@ def admin_gallery_restore_selected():
 
     if ids:
 
-        Post.query.filter(Post.id.in_([int(i) for i in ids])).update({"is_deleted": False}, synchronize_session=False)
-
-        db.session.commit()
+        ids = [int(i) for i in ids]
+        bulk_update_posts((ids[i:i + ADMIN_BULK_CHUNK] for i in range(0, len(ids), ADMIN_BULK_CHUNK)), {"is_deleted": False})
 
     return jsonify({"ok": True})
 
@@ -3641,7 +5780,7 @@ def admin_toggle_featured(post_id):
 
         featured_count = Post.query.filter_by(is_featured=True).count()
 
-        if featured_count >= 4:
+        if featured_count >= FEATURED_MAX:
 
             return jsonify({"error": "max", "msg": "\uba54\uc778 \ucd94\ucc9c\uc740 \ucd5c\ub300 4\uac1c\uc785\ub2c8\ub2e4."}), 400
 
@@ -3657,10 +5796,7 @@ def admin_toggle_featured(post_id):
 def admin_gallery_bulk():
     if not is_admin():
         return redirect(url_for("admin_login"))
-    categories = Category.query.filter(
-        Category.is_active == True,
-        Category.key.notin_(['all', 'bookmark', 'recent'])
-    ).order_by(Category.sort_order).all()
+    categories = category_registry.active(exclude=CATEGORY_HIDDEN_KEYS)
     return render_template("admin_gallery_bulk.html", categories=categories)
 
 @app.route("/admin/gallery/bulk/sample")
@@ -3678,73 +5814,382 @@ def admin_gallery_bulk_sample():
         headers={"Content-disposition": "attachment; filename=sample_bulk_upload.csv"}
     )
 
+# ============ 관리자 백그라운드 작업 ============
+# 오래 걸리는 관리자 작업(대량 등록 등)은 전용 스레드 풀에서 실행하고 진행 상황은 admin_job 테이블에 기록.
+# 작업 쪽 세션 트랜잭션과 섞이지 않도록 별도 연결에서 바로 커밋
+ADMIN_JOB_WORKERS = int(os.getenv("ADMIN_JOB_WORKERS", 2))
+ADMIN_JOB_TTL = 86400
+_job_executor = ThreadPoolExecutor(max_workers=ADMIN_JOB_WORKERS, thread_name_prefix="admin-job")
+
+
+def get_job(job_id):
+    raw = db.session.execute(db.select(AdminJob.data).where(AdminJob.id == job_id)).scalar()
+    return json.loads(raw) if raw else None
+
+
+def update_job(job_id, **fields):
+    now = datetime.utcnow()
+    table = AdminJob.__table__
+    with db.engine.begin() as conn:
+        raw = conn.execute(db.select(table.c.data).where(table.c.id == job_id)).scalar()
+        job = json.loads(raw) if raw else {}
+        job.update(fields, updated_at=now.isoformat())
+        data = json.dumps(job, ensure_ascii=False, default=str)
+        if raw is None:
+            conn.execute(db.insert(table).values(id=job_id, kind=job.get("kind", ""), data=data, updated_at=now))
+        else:
+            conn.execute(db.update(table).where(table.c.id == job_id).values(data=data, updated_at=now))
+    return job
+
+
+def start_job(kind, func, *args):
+    """func(job_id, *args)를 앱 컨텍스트에서 실행 -> job_id. 예외는 status=failed로 기록"""
+    job_id = uuid.uuid4().hex[:16]
+    with db.engine.begin() as conn:
+        conn.execute(db.delete(AdminJob.__table__).where(
+            AdminJob.__table__.c.updated_at < datetime.utcnow() - timedelta(seconds=ADMIN_JOB_TTL)
+        ))
+    update_job(job_id, id=job_id, kind=kind, status="queued", created_at=datetime.utcnow().isoformat())
+
+    def run():
+        with app.app_context():
+            update_job(job_id, status="running")
+            try:
+                func(job_id, *args)
+            except Exception as e:
+                db.session.rollback()
+                print(f"[JOB] {kind} {job_id} 실패: {e}")
+                update_job(job_id, status="failed", error=str(e))
+            finally:
+                db.session.remove()
+
+    _job_executor.submit(run)
+    return job_id
+
+
+@app.route("/admin/api/jobs/<job_id>")
+def admin_api_job(job_id):
+    if not is_admin():
+        return jsonify({"error": "unauthorized"}), 401
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "작업을 찾을 수 없습니다"}), 404
+    return jsonify({"ok": True, "job": job})
+
+
+# ============ 갤러리 CSV 대량 등록 ============
+BULK_IMPORT_CHUNK = int(os.getenv("BULK_IMPORT_CHUNK", 500))
+BULK_IMPORT_MAX_ERRORS = 500  # 리포트에 담는 오류 행 수 상한 (개수는 전부 셈)
+BULK_IMPORT_MAX_BYTES = 50 * 1024 * 1024
+
+
+def _sniff_csv(path):
+    """파일 앞부분으로 인코딩(utf-8/cp949)과 구분자(콤마/탭/세미콜론) 판별 -> (encoding, dialect)"""
+    import codecs
+    import csv
+    with open(path, "rb") as f:
+        sample = f.read(64 * 1024)
+    for encoding in ("utf-8-sig", "cp949"):
+        try:
+            text_sample = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError("파일 인코딩을 인식할 수 없습니다")
+    try:
+        dialect = csv.Sniffer().sniff(text_sample.split("\n", 1)[0], delimiters=",\t;")
+    except csv.Error:
+        dialect = csv.excel_tab if "\t" in text_sample.split("\n", 1)[0] else csv.excel
+    return encoding, dialect
+
+
+def bulk_category_lookup():
+    """대량 등록용 카테고리 매핑: 키(소문자)와 표시 이름 모두 -> 키"""
+    lookup = {}
+    for c in category_registry.all():
+        lookup[c.name.strip()] = c.key
+        lookup[c.key.lower()] = c.key
+    return lookup
+
+
+def _bulk_post_row(row, valid_categories, uploaded_by):
+    """CSV 한 행 검증 -> Post insert 값 dict (문제 있으면 ValueError)"""
+    title = (row.get("title") or "").strip()
+    if not title:
+        raise ValueError("title 없음")
+    if len(title) > 200:
+        raise ValueError("title 200자 초과")
+    raw = (row.get("category") or "").strip()
+    category = valid_categories.get(raw.lower() or "all") or valid_categories.get(raw)
+    if category is None:
+        raise ValueError(f"알 수 없는 카테고리: {raw}")
+    values = {"title": title, "category": category, "uploaded_by": uploaded_by}
+    for col, field in (("video_url", "video_url1"), ("video_url2", "video_url2"),
+                       ("video_url3", "video_url3"), ("coupang_link", "coupang_url")):
+        url = (row.get(field) or "").strip()
+        if url and not url.startswith(("http://", "https://")):
+            raise ValueError(f"{field} URL 형식 오류")
+        values[col] = url
+    is_free = (row.get("is_free") or "0").strip().lower()
+    if is_free not in ("0", "1", "true", "false", "y", "n"):
+        raise ValueError("is_free는 0/1")
+    values["is_free"] = is_free in ("1", "true", "y")
+    return values
+
+
+def _run_bulk_csv_import(job_id, path, uploaded_by):
+    import csv
+    try:
+        encoding, dialect = _sniff_csv(path)
+        with open(path, "rb") as f:
+            total = max(sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b"")) - 1, 0)
+        update_job(job_id, total=total, processed=0, inserted=0, error_count=0, errors=[])
+
+        valid_categories = bulk_category_lookup()
+        inserted = processed = error_count = 0
+        errors, batch = [], []
+
+        def flush():
+            nonlocal inserted
+            if batch:
+                db.session.execute(db.insert(Post), batch)
+                mark_cache_tags("post")
+                db.session.commit()
+                inserted += len(batch)
+                batch.clear()
+
+        with open(path, newline="", encoding=encoding) as f:
+            reader = csv.reader(f, dialect)
+            headers = [h.strip().lower() for h in next(reader, [])]
+            if "title" not in headers:
+                raise ValueError("title 컬럼이 없습니다")
+            for values in reader:
+                if not any(v.strip() for v in values):
+                    continue
+                processed += 1
+                try:
+                    if len(values) > len(headers):
+                        raise ValueError(f"컬럼 수 초과 ({len(values)} > {len(headers)})")
+                    batch.append(_bulk_post_row(dict(zip(headers, values)), valid_categories, uploaded_by))
+                except ValueError as e:
+                    error_count += 1
+                    if len(errors) < BULK_IMPORT_MAX_ERRORS:
+                        errors.append({"line": reader.line_num, "error": str(e)})
+                if len(batch) >= BULK_IMPORT_CHUNK:
+                    flush()
+                    update_job(job_id, processed=processed, inserted=inserted, error_count=error_count)
+            flush()
+        update_job(job_id, status="done", processed=processed, inserted=inserted,
+                   error_count=error_count, errors=errors)
+        print(f"[BULK] CSV 등록 {inserted}건, 오류 {error_count}건")
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
 @app.route("/admin/gallery/bulk/upload", methods=["POST"])
 def admin_gallery_bulk_upload():
+    """CSV를 임시 파일로 받아 백그라운드로 등록 -> job_id (/admin/api/jobs/<job_id>로 진행 상황 조회)"""
     if not is_admin():
         return jsonify({"error": "unauthorized"}), 401
-    
-    import csv
-    import io
-    
+
+    import tempfile
+
     file = request.files.get("csv_file")
     if not file:
         return jsonify({"error": "파일이 없습니다"}), 400
-    
+
+    fd, path = tempfile.mkstemp(prefix="bulk_", suffix=".csv")
+    os.close(fd)
+    file.save(path)
+    if os.path.getsize(path) > BULK_IMPORT_MAX_BYTES:
+        os.remove(path)
+        return jsonify({"error": "파일이 너무 큽니다 (최대 50MB)"}), 400
     try:
-        raw_data = file.read()
-        content = None
-        
-        for encoding in ["utf-8-sig", "utf-8", "cp949", "euc-kr"]:
-            try:
-                content = raw_data.decode(encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-        
-        if content is None:
-            return jsonify({"error": "파일 인코딩을 인식할 수 없습니다"}), 400
-        
-        lines = content.strip().split('\n')
-        delimiter = '\t' if '\t' in lines[0] else ','
-        
-        header_line = lines[0]
-        headers = [h.strip().lower() for h in header_line.split(delimiter)]
-        
-        count = 0
-        for line in lines[1:]:
-            if not line.strip():
-                continue
-            
-            values = line.split(delimiter)
-            row = {}
-            for i, header in enumerate(headers):
-                if i < len(values):
-                    row[header] = values[i].strip()
-                else:
-                    row[header] = ""
-            
-            title = row.get("title", "").strip()
-            if not title:
-                continue
-            
-            post = Post(
-                title=title,
-                category=row.get("category", "all").strip().lower(),
-                video_url=row.get("video_url1", "").strip(),
-                video_url2=row.get("video_url2", "").strip(),
-                video_url3=row.get("video_url3", "").strip(),
-                coupang_link=row.get("coupang_url", "").strip(),
-                is_free=row.get("is_free", "0").strip() == "1",
-                uploaded_by=session.get("user_id")
-            )
-            db.session.add(post)
-            count += 1
-        
-        db.session.commit()
-        return jsonify({"ok": True, "count": count})
-    except Exception as e:
+        _sniff_csv(path)
+    except ValueError as e:
+        os.remove(path)
         return jsonify({"error": str(e)}), 400
 
+    job_id = start_job("bulk_csv", _run_bulk_csv_import, path, session.get("user_id"))
+    return jsonify({"ok": True, "job_id": job_id}), 202
+
+# ============ 갤러리 ZIP 대량 등록 (manifest + 이미지) ============
+# ZIP 안에 manifest.csv(또는 manifest.json)와 이미지 파일. manifest의 images 열은 ZIP 내 경로를 | 또는 ; 로 구분
+ZIP_IMPORT_MAX_BYTES = int(os.getenv("ZIP_IMPORT_MAX_BYTES", 500 * 1024 * 1024))
+ZIP_IMPORT_MAX_UNCOMPRESSED = int(os.getenv("ZIP_IMPORT_MAX_UNCOMPRESSED", 2 * 1024 * 1024 * 1024))
+ZIP_IMPORT_MAX_ENTRIES = 5000
+ZIP_IMPORT_MAX_IMAGE_BYTES = 30 * 1024 * 1024
+ZIP_IMPORT_MAX_RATIO = 100  # 항목별 압축률 상한 (zip bomb 방지)
+ZIP_IMPORT_WORKERS = int(os.getenv("ZIP_IMPORT_WORKERS", 4))
+ZIP_IMPORT_POST_BATCH = 50
+
+
+def _zip_check(zf):
+    """ZIP 항목 수/압축 해제 크기/압축률 검사 -> {경로: ZipInfo} (ValueError)"""
+    infos = [i for i in zf.infolist() if not i.is_dir()]
+    if len(infos) > ZIP_IMPORT_MAX_ENTRIES:
+        raise ValueError(f"ZIP 항목이 너무 많습니다 (최대 {ZIP_IMPORT_MAX_ENTRIES}개)")
+    if sum(i.file_size for i in infos) > ZIP_IMPORT_MAX_UNCOMPRESSED:
+        raise ValueError("압축 해제 크기가 너무 큽니다")
+    for i in infos:
+        if i.file_size > ZIP_IMPORT_MAX_IMAGE_BYTES and not i.filename.lower().endswith((".csv", ".json")):
+            raise ValueError(f"파일이 너무 큽니다: {i.filename}")
+        if i.compress_size and i.file_size / i.compress_size > ZIP_IMPORT_MAX_RATIO and i.file_size > 1024 * 1024:
+            raise ValueError(f"비정상적인 압축률: {i.filename}")
+    return {i.filename: i for i in infos}
+
+
+def _zip_manifest(zf, entries):
+    """manifest.csv / manifest.json -> [(행 번호, {열: 값}, [이미지 경로])]"""
+    import csv
+    import io
+    name = next((n for n in entries if os.path.basename(n).lower() in ("manifest.csv", "manifest.json")), None)
+    if name is None:
+        raise ValueError("manifest.csv 또는 manifest.json이 없습니다")
+    base = os.path.dirname(name)
+    raw = zf.read(name)
+
+    def split_images(value):
+        if isinstance(value, list):
+            items = value
+        else:
+            items = (value or "").replace(";", "|").split("|")
+        return [os.path.normpath(os.path.join(base, i.strip())).replace(os.sep, "/") for i in items if str(i).strip()]
+
+    if name.lower().endswith(".json"):
+        data = json.loads(raw.decode("utf-8-sig"))
+        if not isinstance(data, list):
+            raise ValueError("manifest.json은 배열이어야 합니다")
+        return [(n, {k.lower(): ("1" if v is True else "0" if v is False else v if isinstance(v, (str, list)) else str(v))
+                     for k, v in item.items()}, split_images(item.get("images")))
+                for n, item in enumerate(data, start=1) if isinstance(item, dict)]
+
+    for encoding in ("utf-8-sig", "cp949"):
+        try:
+            text_data = raw.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError("manifest 인코딩을 인식할 수 없습니다")
+    reader = csv.reader(io.StringIO(text_data, newline=""))
+    headers = [h.strip().lower() for h in next(reader, [])]
+    rows = []
+    for values in reader:
+        if any(v.strip() for v in values):
+            row = dict(zip(headers, values))
+            rows.append((reader.line_num, row, split_images(row.get("images"))))
+    return rows
+
+
+def _run_zip_import(job_id, path, uploaded_by):
+    import io
+    import zipfile
+    try:
+        with zipfile.ZipFile(path) as zf:
+            entries = _zip_check(zf)
+            manifest = _zip_manifest(zf, entries)
+            lookup = bulk_category_lookup()
+
+            errors, posts = [], []
+            for line, row, images in manifest:
+                try:
+                    values = _bulk_post_row(row, lookup, uploaded_by)
+                    missing = [i for i in images if i not in entries]
+                    if missing:
+                        raise ValueError(f"ZIP에 없는 이미지: {', '.join(missing[:3])}")
+                    bad = [i for i in images if os.path.splitext(i)[1].lower() not in ALLOWED_EXT]
+                    if bad:
+                        raise ValueError(f"지원하지 않는 이미지 형식: {', '.join(bad[:3])}")
+                    posts.append((line, values, images))
+                except ValueError as e:
+                    errors.append({"line": line, "error": str(e)})
+
+            unique_images = list(dict.fromkeys(i for _, _, imgs in posts for i in imgs))
+            update_job(job_id, total=len(manifest), total_images=len(unique_images),
+                       images_done=0, inserted=0, error_count=len(errors), errors=errors[:BULK_IMPORT_MAX_ERRORS])
+
+            # 이미지 파생본 생성/업로드는 워커 풀에서 병렬 처리 (ZipFile 읽기는 락으로 직렬화)
+            zip_lock = threading.Lock()
+            done_lock = threading.Lock()
+            images_done = 0
+
+            def process(name):
+                nonlocal images_done
+                with zip_lock:
+                    data = zf.read(name)
+                try:
+                    return save_image_derivatives(io.BytesIO(data))
+                except Exception as e:
+                    print(f"[BULK] ZIP 이미지 처리 실패 {name}: {e}")
+                    raise ValueError(f"{name}: {e if isinstance(e, ValueError) else '이미지를 읽을 수 없습니다'}")
+                finally:
+                    with done_lock:
+                        images_done += 1
+
+            inserted = 0
+            with ThreadPoolExecutor(max_workers=ZIP_IMPORT_WORKERS, thread_name_prefix="zip-image") as pool:
+                futures = {name: pool.submit(process, name) for name in unique_images}
+                for start in range(0, len(posts), ZIP_IMPORT_POST_BATCH):
+                    batch = []
+                    for line, values, images in posts[start:start + ZIP_IMPORT_POST_BATCH]:
+                        try:
+                            urls = [futures[i].result() for i in images]
+                        except Exception as e:
+                            errors.append({"line": line, "error": f"이미지 처리 실패 ({e})"})
+                            continue
+                        batch.append(dict(values, images_json=json.dumps(urls, ensure_ascii=False)))
+                    if batch:
+                        db.session.execute(db.insert(Post), batch)
+                        mark_cache_tags("post")
+                        db.session.commit()
+                        inserted += len(batch)
+                    update_job(job_id, images_done=images_done, inserted=inserted,
+                               error_count=len(errors), errors=errors[:BULK_IMPORT_MAX_ERRORS])
+
+        update_job(job_id, status="done", images_done=images_done, inserted=inserted,
+                   error_count=len(errors), errors=errors[:BULK_IMPORT_MAX_ERRORS])
+        print(f"[BULK] ZIP 등록 {inserted}건 (이미지 {images_done}개), 오류 {len(errors)}건")
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@app.route("/admin/gallery/bulk/zip", methods=["POST"])
+def admin_gallery_bulk_zip():
+    """manifest + 이미지 ZIP을 받아 백그라운드로 등록 -> job_id"""
+    if not is_admin():
+        return jsonify({"error": "unauthorized"}), 401
+
+    import tempfile
+    import zipfile
+
+    file = request.files.get("zip_file")
+    if not file:
+        return jsonify({"error": "파일이 없습니다"}), 400
+
+    fd, path = tempfile.mkstemp(prefix="bulk_", suffix=".zip")
+    os.close(fd)
+    file.save(path)
+    try:
+        if os.path.getsize(path) > ZIP_IMPORT_MAX_BYTES:
+            raise ValueError(f"파일이 너무 큽니다 (최대 {ZIP_IMPORT_MAX_BYTES // (1024 * 1024)}MB)")
+        with zipfile.ZipFile(path) as zf:
+            _zip_manifest(zf, _zip_check(zf))
+    except (ValueError, zipfile.BadZipFile, json.JSONDecodeError) as e:
+        os.remove(path)
+        return jsonify({"error": str(e) or "ZIP 파일을 읽을 수 없습니다"}), 400
+
+    job_id = start_job("bulk_zip", _run_zip_import, path, session.get("user_id"))
+    return jsonify({"ok": True, "job_id": job_id}), 202
+
+
 @app.route("/admin/posts")
 def admin_posts():
     if not is_admin():
@@ -3764,8 +6209,7 @@ def admin_gallery_bulk_delete():
         return jsonify({"error": "삭제할 항목이 없습니다"}), 400
     
     try:
-        count = Post.query.filter(Post.id.in_(ids)).update({"is_deleted": True}, synchronize_session=False)
-        db.session.commit()
+        count = bulk_update_posts((ids[i:i + ADMIN_BULK_CHUNK] for i in range(0, len(ids), ADMIN_BULK_CHUNK)), {"is_deleted": True})
         return jsonify({"ok": True, "count": count})
     except Exception as e:
         db.session.rollback()
@@ -3775,10 +6219,7 @@ def admin_gallery_bulk_delete():
 def admin_upload():
     if not is_admin():
         return redirect(url_for("admin_login"))
-    categories = Category.query.filter(
-        Category.is_active == True,
-        Category.key.notin_(['all', 'bookmark', 'recent'])
-    ).order_by(Category.sort_order).all()
+    categories = category_registry.active(exclude=CATEGORY_HIDDEN_KEYS)
     return render_template("admin_upload.html", categories=categories)
 
 def parse_json_list_field(field_name: str):
@@ -3817,7 +6258,7 @@ def admin_edit(post_id):
         if request.headers.get("X-Requested-With") == "XMLHttpRequest":
             return jsonify({"ok": True, "redirect": next_url})
         return redirect(next_url)
-    categories = Category.query.filter(Category.key.notin_(["all","bookmark","recent","popular"])).filter_by(is_active=True).order_by(Category.sort_order).all()
+    categories = category_registry.active(exclude=CATEGORY_HIDDEN_KEYS + ("popular",))
     return render_template("admin_edit.html", post=p, post_data=p.to_dict(), next_url=next_url, categories=categories)
 
 @app.route("/admin/posts/<int:post_id>/delete", methods=["POST"])
@@ -3842,13 +6283,17 @@ def admin_delete(post_id):
 # ----------------------------
 # Admin Link Requests
 # ----------------------------
+ADMIN_LINK_PAGE = 30
+ADMIN_LINK_COUNT_CAP = 10000
+
+
 @app.route("/admin/link-requests")
 def admin_link_requests():
     if not is_admin():
         return redirect(url_for("admin_login"))
-    page = request.args.get("page", 1, type=int)
     status_filter = request.args.get("status", "all")
     search = (request.args.get("q") or "").strip()
+    before = request.args.get("before", type=int)
 
     query = LinkRequest.query
     if status_filter == "pending":
@@ -3856,13 +6301,21 @@ def admin_link_requests():
     elif status_filter == "done":
         query = query.filter(LinkRequest.coupang_url != None, LinkRequest.coupang_url != "")
     if search:
+        # PostgreSQL에선 컬럼별 pg_trgm GIN 인덱스가 부분 일치 ilike를 받음
         query = query.filter(
             (LinkRequest.requester_email.ilike(f"%{search}%")) |
             (LinkRequest.original_url.ilike(f"%{search}%")) |
             (LinkRequest.title.ilike(f"%{search}%"))
         )
-    pagination = query.order_by(LinkRequest.id.desc()).paginate(page=page, per_page=30, error_out=False)
-    return render_template("admin_link_requests.html", items=pagination.items, pagination=pagination, status_filter=status_filter, search=search)
+    total, total_capped = _capped_count(query, ADMIN_LINK_COUNT_CAP, LinkRequest.id)
+    # OFFSET 대신 id 커서 (대기열 페이지가 뒤로 갈수록 느려지지 않음)
+    if before:
+        query = query.filter(LinkRequest.id < before)
+    items = query.order_by(LinkRequest.id.desc()).limit(ADMIN_LINK_PAGE + 1).all()
+    next_cursor = items[ADMIN_LINK_PAGE - 1].id if len(items) > ADMIN_LINK_PAGE else None
+    return render_template("admin_link_requests.html", items=items[:ADMIN_LINK_PAGE], status_filter=status_filter,
+                           search=search, before=before, next_cursor=next_cursor,
+                           total=total, total_capped=total_capped)
 
 
 @app.route("/api/link-request/<int:request_id>/update-url", methods=["POST"])
@@ -3878,19 +6331,56 @@ def api_link_request_update_url(request_id):
         return jsonify({"ok": False, "error": "URL을 입력하세요."})
     if not coupang_url.startswith(("http://", "https://")):
         return jsonify({"ok": False, "error": "올바른 URL을 입력하세요."})
-    it.coupang_url = coupang_url
-    db.session.commit()
-    user = User.query.filter_by(email=it.requester_email).first()
-    if user:
-        db.session.add(Notification(
-            user_id=user.id,
-            type="link_completed",
-            title="링크요청 완료",
-            message=f"'{it.title}' 요청의 쿠팡 링크가 등록되었습니다!",
-            link=f"/link-requests/{it.id}"
-        ))
-        db.session.commit()
-    return jsonify({"ok": True})
+    siblings = fulfill_link_request(it, coupang_url)
+    return jsonify({"ok": True, "siblings": siblings})
+
+
+LINK_FULFILL_BATCH_MAX = 500
+
+
+@app.route("/api/link-requests/fulfill-batch", methods=["POST"])
+def api_link_requests_fulfill_batch():
+    """여러 요청의 쿠팡 링크를 한 트랜잭션으로 등록.
+    body: {items: [{id, coupang_url}, ...]} -> {ok, results: [{id, ok, error?, siblings?}, ...]} (입력 순서)"""
+    if not is_admin():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    items = (request.get_json(silent=True) or {}).get("items")
+    if not isinstance(items, list) or not items:
+        return jsonify({"ok": False, "error": "items가 필요합니다."}), 400
+    if len(items) > LINK_FULFILL_BATCH_MAX:
+        return jsonify({"ok": False, "error": f"한 번에 최대 {LINK_FULFILL_BATCH_MAX}건까지 처리할 수 있습니다."}), 400
+
+    results, valid = [], {}
+    for item in items:
+        item = item if isinstance(item, dict) else {}
+        try:
+            request_id = int(item.get("id"))
+        except (TypeError, ValueError):
+            results.append({"id": item.get("id"), "ok": False, "error": "잘못된 id"})
+            continue
+        coupang_url = str(item.get("coupang_url") or "").strip()
+        result = {"id": request_id, "ok": False}
+        results.append(result)
+        if request_id in valid:
+            result["error"] = "중복된 id"
+        elif not coupang_url:
+            result["error"] = "URL을 입력하세요."
+        elif not coupang_url.startswith(("http://", "https://")) or len(coupang_url) > 2000:
+            result["error"] = "올바른 URL을 입력하세요."
+        else:
+            valid[request_id] = coupang_url
+
+    rows = {it.id: it for it in LinkRequest.query.filter(LinkRequest.id.in_(list(valid))).all()} if valid else {}
+    pairs = [(rows[i], url) for i, url in valid.items() if i in rows]
+    siblings = fulfill_link_requests(pairs) if pairs else {}
+    for result in results:
+        if "error" in result:
+            continue
+        if result["id"] in rows:
+            result.update(ok=True, siblings=siblings[result["id"]])
+        else:
+            result["error"] = "not found"
+    return jsonify({"ok": True, "results": results})
 
 
 # ----------------------------
@@ -3998,7 +6488,6 @@ def admin_store_new():
             is_active=request.form.get("is_active") in ("on", "1")
         ))
         db.session.commit()
-        cache.delete("view//store")
         return redirect(url_for("admin_store"))
     return render_template("admin_store_new.html")
 
@@ -4019,7 +6508,6 @@ def admin_store_edit(product_id):
         p.badge = (request.form.get("badge") or "").strip()
         p.is_active = request.form.get("is_active") in ("on", "1")
         db.session.commit()
-        cache.delete("view//store")
         return redirect(url_for("admin_store"))
     return render_template("admin_store_edit.html", product=p)
 
@@ -4029,7 +6517,6 @@ def admin_store_delete(product_id):
         return redirect(url_for("admin_login"))
     db.session.delete(StoreProduct.query.get_or_404(product_id))
     db.session.commit()
-    cache.delete("view//store")
     flash("상품이 삭제되었습니다.", "success")
     return redirect(url_for("admin_store"))
 
@@ -4673,17 +7160,58 @@ with app.app_context():
         db.create_all()
         print("=== DB TABLES CREATED SUCCESSFULLY ===")
         # pg_api_token 컬럼 자동 마이그레이션
-        from sqlalchemy import text, inspect
+        from sqlalchemy import text
         insp = inspect(db.engine)
         cols = [c["name"] for c in insp.get_columns("user")]
         if "pg_api_token" not in cols:
             db.session.execute(text('ALTER TABLE "user" ADD COLUMN pg_api_token VARCHAR(64)'))
             db.session.commit()
             print("=== MIGRATION: pg_api_token 컬럼 추가 완료 ===")
+        post_cols = [c["name"] for c in insp.get_columns("community_post")]
+        if "like_count" not in post_cols:
+            db.session.execute(text('ALTER TABLE community_post ADD COLUMN like_count INTEGER NOT NULL DEFAULT 0'))
+            db.session.execute(text('CREATE INDEX IF NOT EXISTS ix_community_post_like_count ON community_post (like_count)'))
+            db.session.execute(text(
+                'UPDATE community_post SET like_count = '
+                '(SELECT COUNT(*) FROM community_like WHERE community_like.post_id = community_post.id)'
+            ))
+            db.session.commit()
+            print("=== MIGRATION: community_post.like_count 컬럼 추가 + 백필 완료 ===")
+        if "comment_count" not in post_cols:
+            db.session.execute(text('ALTER TABLE community_post ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0'))
+            db.session.execute(text(
+                'UPDATE community_post SET comment_count = '
+                '(SELECT COUNT(*) FROM community_comment WHERE community_comment.post_id = community_post.id)'
+            ))
+            db.session.commit()
+            print("=== MIGRATION: community_post.comment_count 컬럼 추가 + 백필 완료 ===")
+        outbox_cols = [c["name"] for c in insp.get_columns("message_outbox")]
+        if "campaign_id" not in outbox_cols:
+            db.session.execute(text('ALTER TABLE message_outbox ADD COLUMN campaign_id INTEGER'))
+            db.session.execute(text('CREATE INDEX IF NOT EXISTS ix_message_outbox_campaign_id ON message_outbox (campaign_id)'))
+            db.session.commit()
+            print("=== MIGRATION: message_outbox.campaign_id 컬럼 추가 완료 ===")
+        pg_rev_cols = [c["name"] for c in insp.get_columns("pg_token_revocation")]
+        if "replan_before" not in pg_rev_cols:
+            db.session.execute(text('ALTER TABLE pg_token_revocation ADD COLUMN replan_before TIMESTAMP'))
+            db.session.commit()
+            print("=== MIGRATION: pg_token_revocation.replan_before 컬럼 추가 완료 ===")
+        link_cols = [c["name"] for c in insp.get_columns("link_request")]
+        if "canonical_hash" not in link_cols:
+            db.session.execute(text('ALTER TABLE link_request ADD COLUMN canonical_hash VARCHAR(40)'))
+            db.session.execute(text('CREATE INDEX IF NOT EXISTS ix_link_request_canonical_hash ON link_request (canonical_hash)'))
+            db.session.commit()
+            print("=== MIGRATION: link_request.canonical_hash 컬럼 추가 완료 (백필은 백그라운드) ===")
+        if "canonical_version" not in link_cols:
+            db.session.execute(text('ALTER TABLE link_request ADD COLUMN canonical_version SMALLINT'))
+            db.session.commit()
+            print("=== MIGRATION: link_request.canonical_version 컬럼 추가 완료 (해시 재계산은 백그라운드) ===")
     except Exception as e:
         print(f"=== DB ERROR: {e} ===")
     init_default_categories()
 
+start_outbox_worker()
+
 # 에러 핸들러
 @app.errorhandler(404)
 def page_not_found(e):
@@ -4696,6 +7224,7 @@ def internal_server_error(e):
 
 # ============ 공구/협찬 ============
 @app.route("/groupbuy")
+@anonymous_page_cache(timeout=tagged_ttl(600, 60), tags=("groupbuy",))
 def groupbuy_list():
     now = datetime.now()
     items = GroupBuy.query.filter(GroupBuy.status != "ended").order_by(GroupBuy.created_at.desc()).all()
@@ -4911,7 +7440,7 @@ def api_youtube_video_detail(video_id):
         return jsonify({"ok": False, "error": str(e)})
 
 @app.route("/api/gallery")
-@cache.cached(timeout=60, query_string=True)
+@cache.cached(timeout=tagged_ttl(3600, 60), make_cache_key=tagged_cache_key("post", "category", query_string=True))
 def api_gallery():
     page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 30, type=int)
@@ -5099,6 +7628,7 @@ def my_nickname():
             return render_template("my_nickname.html", user=user, error="이미 사용 중인 닉네임입니다")
         user.nickname = new_nickname
         db.session.commit()
+        nickname_cache.invalidate(user.email)
         # 세션에 닉네임 반영
         session["nickname"] = new_nickname
         return redirect(url_for("my_page"))
@@ -5124,12 +7654,15 @@ def account_withdraw():
         return jsonify({"ok": False, "error": "활성 구독을 먼저 해지해주세요."})
 
     # 소프트 삭제: 이메일 변경 + 비활성화
+    nickname_cache.invalidate(user.email)
     user.email = f"withdrawn_{user.id}_{user.email}"
     user.pw_hash = ""
     user.kakao_id = None
     user.nickname = None
     user.profile_photo = ""
     user.session_token = None
+    user.pg_api_token = None
+    revoke_pg_tokens(user.id)
     db.session.commit()
 
     session.clear()
@@ -5271,6 +7804,252 @@ def support():
 # ----------------------------
 # 알림
 # ----------------------------
+class NotificationHub:
+    """유저별 알림 이벤트 전달 (SSE/롱폴링 구독자에게).
+    REDIS_URL이 있으면 Redis 채널로 발행해 모든 gunicorn 워커가 받고, 없으면 같은 프로세스 안에서만 전달"""
+
+    CHANNEL = "moneying:notifications"
+
+    def __init__(self, redis_url=""):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._redis = None
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(redis_url)
+                threading.Thread(target=self._listen, name="notify-redis", daemon=True).start()
+                print("[NOTIFY] Redis pub/sub 사용")
+            except Exception as e:
+                print(f"[NOTIFY] Redis 사용 불가, 프로세스 내부 전달로 대체: {e}")
+                self._redis = None
+
+    def subscribe(self, user_id):
+        q = queue.Queue(maxsize=100)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            subs = self._subscribers.get(user_id)
+            if subs:
+                subs.discard(q)
+                if not subs:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, event_data):
+        if self._redis is not None:
+            try:
+                self._redis.publish(self.CHANNEL, json.dumps({"user_id": user_id, "event": event_data}, ensure_ascii=False))
+                return
+            except Exception as e:
+                print(f"[NOTIFY] Redis 발행 실패, 로컬 전달: {e}")
+        self._deliver(user_id, event_data)
+
+    def publish_many(self, user_ids, event_data):
+        """여러 유저에게 같은 이벤트 (Redis 메시지 1건)"""
+        if self._redis is not None:
+            try:
+                self._redis.publish(self.CHANNEL, json.dumps({"user_ids": list(user_ids), "event": event_data}, ensure_ascii=False))
+                return
+            except Exception as e:
+                print(f"[NOTIFY] Redis 발행 실패, 로컬 전달: {e}")
+        self._deliver_many(user_ids, event_data)
+
+    def _deliver_many(self, user_ids, event_data):
+        # _deliver와 같이 워커마다 안 읽은 수 캐시 무효화 (키 여러 개를 한 번에)
+        cache.delete_many(*[f"noti_unread:{u}" for u in user_ids])
+        with self._lock:
+            targets = [q for uid in user_ids for q in self._subscribers.get(uid, ())]
+        for q in targets:
+            try:
+                q.put_nowait(event_data)
+            except queue.Full:
+                pass
+
+    def _deliver(self, user_id, event_data):
+        cache.delete(f"noti_unread:{user_id}")
+        with self._lock:
+            subs = list(self._subscribers.get(user_id, ()))
+        for q in subs:
+            try:
+                q.put_nowait(event_data)
+            except queue.Full:
+                pass
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.CHANNEL)
+                for msg in pubsub.listen():
+                    try:
+                        data = json.loads(msg["data"])
+                        if "user_ids" in data:
+                            self._deliver_many([int(u) for u in data["user_ids"]], data["event"])
+                        else:
+                            self._deliver(int(data["user_id"]), data["event"])
+                    except Exception:
+                        continue
+            except Exception as e:
+                print(f"[NOTIFY] Redis 구독 끊김, 재연결: {e}")
+                time.sleep(3)
+
+
+notification_hub = NotificationHub(REDIS_URL)
+
+
+def _notification_event(n):
+    return {
+        "type": "notification",
+        "notification": {
+            "id": n.id, "type": n.type, "title": n.title,
+            "message": n.message, "link": n.link,
+            "created_at": n.created_at.isoformat() if n.created_at else None,
+        },
+    }
+
+
+@event.listens_for(Notification, "after_insert")
+def _collect_new_notification(mapper, connection, target):
+    if (target.type or "").startswith("quest_"):
+        return
+    sess = object_session(target)
+    if sess is None:
+        return
+    sess.info.setdefault("notify_pending", []).append((target.user_id, _notification_event(target)))
+
+
+def insert_notifications(rows):
+    """알림 dict 목록을 한 번의 bulk INSERT로 (커밋은 호출한 쪽) -> 생성된 행 목록.
+    ORM 이벤트를 타지 않으므로 커밋 후 publish_notifications()로 직접 발행"""
+    if not rows:
+        return []
+    return db.session.execute(
+        db.insert(Notification).returning(
+            Notification.id, Notification.user_id, Notification.type, Notification.title,
+            Notification.message, Notification.link, Notification.created_at,
+            sort_by_parameter_order=True,
+        ),
+        rows,
+    ).all()
+
+
+def publish_notifications(created):
+    for n in created:
+        if not (n.type or "").startswith("quest_"):
+            notification_hub.publish(n.user_id, _notification_event(n))
+
+
+@event.listens_for(db.session, "after_commit")
+def _publish_new_notifications(sess):
+    for user_id, event_data in sess.info.pop("notify_pending", []):
+        notification_hub.publish(user_id, event_data)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_new_notifications(sess):
+    sess.info.pop("notify_pending", None)
+
+
+def notify_unread_changed(user_id):
+    """읽음 처리/삭제 등 일괄 쿼리로 안 읽은 수가 바뀐 경우 (ORM 이벤트가 없으므로 커밋 후 직접 호출)"""
+    notification_hub.publish(user_id, {"type": "unread"})
+
+
+def get_unread_count(user_id):
+    key = f"noti_unread:{user_id}"
+    count = cache.get(key)
+    if count is None:
+        count = Notification.query.filter(
+            Notification.user_id == user_id, Notification.is_read == False, ~Notification.type.like("quest_%")
+        ).count()
+        cache.set(key, count, timeout=30)
+    return count
+
+
+# ============ 알림 일괄 발송 (세그먼트 fan-out) ============
+# 유저 id 구간별 INSERT ... SELECT로 알림 생성 (ORM 객체 없이 DB 안에서 복사). 진행 상황은 관리자 작업(job:<id>)으로 조회
+NOTIFY_FANOUT_CHUNK = int(os.getenv("NOTIFY_FANOUT_CHUNK", 5000))
+NOTIFICATION_SEGMENTS = ("all", "active_subscribers", "allinone", "trial", "sellers")
+
+
+def notification_segment_filter(segment, now=None):
+    """세그먼트 -> User 조건 목록 (탈퇴 회원 제외)"""
+    now = now or datetime.utcnow()
+    conds = [~User.email.startswith("withdrawn_", autoescape=True)]
+    active_sub = db.and_(
+        Subscription.user_id == User.id, Subscription.status == "active",
+        db.or_(Subscription.expires_at.is_(None), Subscription.expires_at > now),
+    )
+    if segment == "active_subscribers":
+        conds.append(db.exists().where(active_sub))
+    elif segment == "allinone":
+        conds.append(db.exists().where(active_sub, Subscription.plan_type == "allinone"))
+    elif segment == "trial":
+        conds.append(User.free_trial_expires > now)
+    elif segment == "sellers":
+        conds.append(User.is_seller == True)
+    elif segment != "all":
+        raise ValueError(f"알 수 없는 세그먼트: {segment}")
+    return conds
+
+
+def _run_notification_fanout(job_id, segment, fields):
+    now = datetime.utcnow()
+    conds = notification_segment_filter(segment, now)
+    total = db.session.query(db.func.count(User.id)).filter(*conds).scalar() or 0
+    lo, hi = db.session.query(db.func.min(User.id), db.func.max(User.id)).filter(*conds).one()
+    update_job(job_id, segment=segment, total=total, inserted=0)
+    inserted = 0
+    columns = ["user_id", "type", "title", "message", "link", "is_read", "created_at"]
+    start = (lo or 1) - 1
+    while hi is not None and start < hi:
+        end = start + NOTIFY_FANOUT_CHUNK
+        in_range = conds + [User.id > start, User.id <= end]
+        user_ids = [u for (u,) in db.session.query(User.id).filter(*in_range)]
+        # 조회한 id 목록 그대로 삽입 - 그 사이 가입한 유저가 캐시 무효화/이벤트에서 빠지지 않게
+        if user_ids:
+            db.session.execute(db.insert(Notification).from_select(columns, db.select(
+                User.id, db.literal(fields["type"], db.String), db.literal(fields["title"], db.String),
+                db.literal(fields["message"], db.Text), db.literal(fields["link"], db.String),
+                db.literal(False, db.Boolean), db.literal(now, db.DateTime),
+            ).where(User.id.in_(user_ids))))
+            db.session.commit()
+            # 안 읽은 수 캐시 무효화 + 접속 중인 유저에겐 수 변경 이벤트 (_deliver_many)
+            notification_hub.publish_many(user_ids, {"type": "unread"})
+            inserted += len(user_ids)
+            update_job(job_id, inserted=inserted)
+        start = end
+    update_job(job_id, status="done", inserted=inserted)
+    print(f"[NOTIFY] 일괄 발송 {segment}: {inserted}명")
+
+
+@app.route("/admin/api/notifications/fanout", methods=["POST"])
+def admin_notification_fanout():
+    """세그먼트 전체에 알림 발송 (백그라운드 작업)
+    body: {"segment": all|active_subscribers|allinone|trial|sellers, "title", "message", "link", "type"} -> 202 {job_id}"""
+    if not is_admin():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    data = request.get_json(silent=True) or {}
+    segment = data.get("segment")
+    if segment not in NOTIFICATION_SEGMENTS:
+        return jsonify({"ok": False, "error": f"segment는 {', '.join(NOTIFICATION_SEGMENTS)} 중 하나여야 합니다."}), 400
+    fields = {
+        "type": (data.get("type") or "notice").strip()[:50],
+        "title": (data.get("title") or "").strip()[:200],
+        "message": (data.get("message") or "").strip(),
+        "link": (data.get("link") or "").strip()[:500] or None,
+    }
+    if not fields["title"]:
+        return jsonify({"ok": False, "error": "제목을 입력하세요."}), 400
+    if fields["type"].startswith("quest_"):
+        return jsonify({"ok": False, "error": "사용할 수 없는 알림 유형입니다."}), 400
+    job_id = start_job("notification_fanout", _run_notification_fanout, segment, fields)
+    return jsonify({"ok": True, "job_id": job_id}), 202
+
+
 @app.route("/notifications")
 def notifications():
     if not session.get("user_id"):
@@ -5287,18 +8066,17 @@ def api_notifications_mark_read():
     
     Notification.query.filter_by(user_id=session["user_id"], is_read=False).update({"is_read": True})
     db.session.commit()
+    notify_unread_changed(session["user_id"])
     return jsonify({"ok": True})
 
 
 @app.route("/api/notifications/count")
 def api_notifications_count():
-    from flask import make_response
     if not session.get("user_id"):
         resp = make_response(jsonify({"count": 0, "user_id": None}))
     else:
         user_id = session["user_id"]
-        count = Notification.query.filter(Notification.user_id==user_id, Notification.is_read==False, ~Notification.type.like("quest_%")).count()
-        resp = make_response(jsonify({"count": count, "user_id": user_id}))
+        resp = make_response(jsonify({"count": get_unread_count(user_id), "user_id": user_id}))
     
     resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
     resp.headers["Pragma"] = "no-cache"
@@ -5316,6 +8094,7 @@ def api_notification_delete(noti_id):
     
     db.session.delete(noti)
     db.session.commit()
+    notify_unread_changed(session["user_id"])
     return jsonify({"ok": True})
 
 @app.route("/api/notifications/delete-all", methods=["POST"])
@@ -5325,12 +8104,178 @@ def api_notifications_delete_all():
     
     Notification.query.filter_by(user_id=session["user_id"]).delete()
     db.session.commit()
+    notify_unread_changed(session["user_id"])
     return jsonify({"ok": True})
 
 
+_notify_wait_slots = threading.BoundedSemaphore(max(1, NOTIFY_MAX_WAITERS))
+
+
+@app.route("/api/notifications/stream")
+def api_notifications_stream():
+    """알림 SSE 스트림: 접속 시 안 읽은 수, 이후 새 알림(event: notification)과 수 변경(event: unread) 푸시.
+    NOTIFY_STREAM_SECONDS 후 종료하면 EventSource가 자동 재연결.
+    동시 대기 연결이 NOTIFY_MAX_WAITERS개면 503 -> 브라우저는 롱폴링으로 전환"""
+    from flask import Response
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"ok": False, "error": "login_required"}), 401
+    if not _notify_wait_slots.acquire(blocking=False):
+        return jsonify({"ok": False, "error": "busy"}), 503
+    q = notification_hub.subscribe(user_id)
+
+    def generate():
+        try:
+            yield "retry: 5000\n\n"
+            with app.app_context():
+                count = get_unread_count(user_id)
+            yield f"event: unread\ndata: {json.dumps({'count': count})}\n\n"
+            deadline = time.monotonic() + NOTIFY_STREAM_SECONDS
+            while time.monotonic() < deadline:
+                try:
+                    event_data = q.get(timeout=min(15, max(0.1, deadline - time.monotonic())))
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if event_data.get("notification"):
+                    yield f"event: notification\ndata: {json.dumps(event_data['notification'], ensure_ascii=False)}\n\n"
+                with app.app_context():
+                    count = get_unread_count(user_id)
+                yield f"event: unread\ndata: {json.dumps({'count': count})}\n\n"
+        finally:
+            notification_hub.unsubscribe(user_id, q)
+
+    resp = Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    resp.call_on_close(_notify_wait_slots.release)
+    return resp
+
+
+@app.route("/api/notifications/poll")
+def api_notifications_poll():
+    """SSE를 못 쓸 때의 롱폴링: since(클라이언트가 아는 안 읽은 수)와 다르면 즉시, 같으면 변경/타임아웃까지 대기.
+    대기 슬롯이 없으면 바로 busy=true로 응답 -> 브라우저는 잠시 쉬었다 재시도"""
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"ok": False, "error": "login_required"}), 401
+    since = request.args.get("since", type=int)
+    q = None
+    if since is not None and _notify_wait_slots.acquire(blocking=False):
+        # 수를 읽기 전에 구독해야 그 사이 도착한 알림을 놓치지 않음
+        q = notification_hub.subscribe(user_id)
+    try:
+        count = get_unread_count(user_id)
+        if q is not None and count == since:
+            db.session.close()  # 대기 중에는 DB 연결을 풀에 반환
+            try:
+                q.get(timeout=NOTIFY_LONGPOLL_SECONDS)
+            except queue.Empty:
+                pass
+            count = get_unread_count(user_id)
+    finally:
+        if q is not None:
+            notification_hub.unsubscribe(user_id, q)
+            _notify_wait_slots.release()
+    notifications = []
+    if since is not None and count > since:
+        notifications = [_notification_event(n)["notification"] for n in Notification.query.filter(
+            Notification.user_id == user_id, Notification.is_read == False, ~Notification.type.like("quest_%")
+        ).order_by(Notification.id.desc()).limit(min(count - since, 10)).all()]
+    resp = jsonify({"ok": True, "count": count, "changed": since is not None and count != since,
+                    "busy": since is not None and q is None, "notifications": notifications})
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+
 
 
 
+# ============ 프로핏가드 이벤트 슬롯 카운터 ============
+# 신청 트랜잭션 안에서 "claimed < cap"인 경우에만 +1 → 동시 신청이 몰려도 정원 초과 없음
+# (신청이 롤백되면 카운터 증가도 함께 롤백). 남은 자리는 SSE로 브라우저에 푸시
+PG_EVENT_KEY = "profitguard_event"
+PG_EVENT_COUNT_CACHE_KEY = "pg_event:count"
+
+_event_count_cond = threading.Condition()
+_event_stream_slots = threading.BoundedSemaphore(max(1, PG_EVENT_MAX_STREAMS))
+
+
+def seed_event_slot_counter():
+    """카운터 행이 없으면 기존 신청 수로 초기화, 정원(PG_EVENT_SLOTS) 변경 반영"""
+    row = db.session.get(EventSlotCounter, PG_EVENT_KEY)
+    if not row:
+        db.session.add(EventSlotCounter(key=PG_EVENT_KEY, claimed=EventTrialApply.query.count(), cap=PG_EVENT_SLOTS))
+        db.session.commit()
+    elif row.cap != PG_EVENT_SLOTS:
+        row.cap = PG_EVENT_SLOTS
+        db.session.commit()
+
+
+def claim_event_slot():
+    """슬롯 1개 선점 (커밋은 호출한 쪽 트랜잭션에서). 마감이면 False"""
+    res = db.session.execute(
+        db.update(EventSlotCounter)
+        .where(EventSlotCounter.key == PG_EVENT_KEY, EventSlotCounter.claimed < EventSlotCounter.cap)
+        .values(claimed=EventSlotCounter.claimed + 1)
+    )
+    return res.rowcount == 1
+
+
+def get_event_count(fresh=False):
+    """신청 수 (프로세스 캐시 3초 - 다른 워커의 신청은 최대 3초 뒤 반영)"""
+    count = None if fresh else cache.get(PG_EVENT_COUNT_CACHE_KEY)
+    if count is None:
+        row = db.session.get(EventSlotCounter, PG_EVENT_KEY)
+        count = row.claimed if row else 0
+        cache.set(PG_EVENT_COUNT_CACHE_KEY, count, timeout=3)
+    return count
+
+
+def publish_event_count():
+    """신청 커밋 후 호출: 캐시 갱신 + 이 프로세스의 SSE 스트림 깨우기"""
+    count = get_event_count(fresh=True)
+    with _event_count_cond:
+        _event_count_cond.notify_all()
+    return count
+
+
+with app.app_context():
+    try:
+        seed_event_slot_counter()
+    except Exception as e:
+        print(f"[PG EVENT] 카운터 초기화 실패: {e}")
+
+with app.app_context():
+    try:
+        seed_community_category_counts()
+    except Exception as e:
+        print(f"[COMMUNITY] 카테고리 카운트 초기화 실패: {e}")
+
+with app.app_context():
+    try:
+        seed_link_request_quota()
+    except Exception as e:
+        print(f"[LINK QUOTA] 사용량 백필 실패: {e}")
+
+with app.app_context():
+    try:
+        if db.session.query(db.exists().where(stale_link_hash_filter())).scalar():
+            start_job("link_hash_backfill", backfill_link_request_hashes)
+    except Exception as e:
+        print(f"[LINK HASH] 백필 시작 실패: {e}")
+
+with app.app_context():
+    try:
+        with db.engine.connect() as conn:
+            missing_link_indexes = link_request_missing_indexes(conn)
+        if missing_link_indexes:
+            start_job("link_request_indexes", build_link_request_indexes)
+    except Exception as e:
+        print(f"[LINK INDEX] 인덱스 생성 시작 실패: {e}")
+
 
 def _apply_profitguard_event(user):
 
@@ -5340,7 +8285,7 @@ def _apply_profitguard_event(user):
 
         return
 
-    if EventTrialApply.query.count() >= 100:
+    if not claim_event_slot():
 
         return
 
@@ -5352,7 +8297,7 @@ def _apply_profitguard_event(user):
 
         temp_pw = "".join(_secrets.choice(_string.ascii_letters + _string.digits) for _ in range(10))
 
-        user.pw_hash = generate_password_hash(temp_pw)
+        user.pw_hash = hash_password(temp_pw)
 
         user.pg_password_set = True
 
@@ -5362,23 +8307,20 @@ def _apply_profitguard_event(user):
 
         db.session.add(Subscription(user_id=user.id, plan_type="profitguard_pro", status="active", price=0, expires_at=datetime.utcnow() + timedelta(days=14)))
 
-    db.session.commit()
-
+    # \uc54c\ub9bc\ud1a1\uc740 \uc544\uc6c3\ubc15\uc2a4\uc5d0 \uc801\uc7ac \u2192 \uc2e0\uccad \ud2b8\ub79c\uc7ad\uc158\uacfc \ud568\uaed8 \ucee4\ubc0b
     if user.phone:
 
-        try:
-
-            pw_text = temp_pw if temp_pw else "(existing password)"
+        pw_text = temp_pw if temp_pw else "(existing password)"
 
-            msg = "\ud504\ub85c\ud54f\uac00\ub4dc 14\uc77c \ubb34\ub8cc\uccb4\ud5d8 \uc2e0\uccad\uc774 \uc644\ub8cc\ub418\uc5c8\uc2b5\ub2c8\ub2e4.\n\n\uc774\uba54\uc77c: " + user.email + "\n\uc784\uc2dc \ube44\ubc00\ubc88\ud638: " + pw_text + "\n\uccb4\ud5d8 \uae30\uac04: 14\uc77c\n\n\uc544\ub798 \ubc84\ud2bc\uc5d0\uc11c \ub85c\uadf8\uc778 \ud6c4\n\ud504\ub85c\ud54f\uac00\ub4dc\ub97c \ub2e4\uc6b4\ub85c\ub4dc\ud558\uc138\uc694."
+        msg = "\ud504\ub85c\ud54f\uac00\ub4dc 14\uc77c \ubb34\ub8cc\uccb4\ud5d8 \uc2e0\uccad\uc774 \uc644\ub8cc\ub418\uc5c8\uc2b5\ub2c8\ub2e4.\n\n\uc774\uba54\uc77c: " + user.email + "\n\uc784\uc2dc \ube44\ubc00\ubc88\ud638: " + pw_text + "\n\uccb4\ud5d8 \uae30\uac04: 14\uc77c\n\n\uc544\ub798 \ubc84\ud2bc\uc5d0\uc11c \ub85c\uadf8\uc778 \ud6c4\n\ud504\ub85c\ud54f\uac00\ub4dc\ub97c \ub2e4\uc6b4\ub85c\ub4dc\ud558\uc138\uc694."
 
-            button = {"button": [{"name": "\ucc44\ub110 \ucd94\uac00", "type": "AC"}, {"name": "\ud504\ub85c\ud54f\uac00\ub4dc \ubc14\ub85c\uac00\uae30", "type": "WL", "url_mobile": "https://moneying.biz/profitguard", "url_pc": "https://moneying.biz/profitguard"}]}
+        button = {"button": [{"name": "\ucc44\ub110 \ucd94\uac00", "type": "AC"}, {"name": "\ud504\ub85c\ud54f\uac00\ub4dc \ubc14\ub85c\uac00\uae30", "type": "WL", "url_mobile": "https://moneying.biz/profitguard", "url_pc": "https://moneying.biz/profitguard"}]}
 
-            send_alimtalk(user.phone, "\ud504\ub85c\ud54f\uac00\ub4dc \ubb34\ub8cc\uccb4\ud5d8 \uc548\ub0b4", msg, "UF_4244", button)
+        queue_alimtalk(user.phone, "\ud504\ub85c\ud54f\uac00\ub4dc \ubb34\ub8cc\uccb4\ud5d8 \uc548\ub0b4", msg, "UF_4244", button, sensitive=bool(temp_pw))
 
-        except Exception as e:
+    db.session.commit()
 
-            print(f"[PG EVENT] alimtalk fail: {e}")
+    publish_event_count()
 
 
 
@@ -5416,7 +8358,7 @@ def profitguard_event_apply_loggedin():
 
         _apply_profitguard_event(user)
 
-        return jsonify({"ok": True, "count": EventTrialApply.query.count()})
+        return jsonify({"ok": True, "count": get_event_count()})
 
     except Exception as e:
 
@@ -5428,12 +8370,49 @@ def profitguard_event_apply_loggedin():
 
 def profitguard_event_count():
 
-    count = EventTrialApply.query.count()
+    resp = jsonify({"ok": True, "count": get_event_count(), "cap": PG_EVENT_SLOTS})
 
-    resp = jsonify({"ok": True, "count": count})
+    resp.headers["Cache-Control"] = "public, max-age=3"
+
+    return resp
 
-    resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
 
+
+@app.route("/api/profitguard-event/stream")
+def profitguard_event_stream():
+    """남은 자리 SSE 스트림. 같은 워커의 신청은 즉시, 다른 워커의 신청은 5초 이내 반영.
+    PG_EVENT_STREAM_SECONDS 후 종료하면 EventSource가 자동 재연결.
+    동시 스트림이 PG_EVENT_MAX_STREAMS개면 503 -> 브라우저는 간격을 늘려가며 재연결"""
+    from flask import Response
+    if not _event_stream_slots.acquire(blocking=False):
+        return jsonify({"ok": False, "error": "busy"}), 503
+
+    def generate():
+        yield "retry: 5000\n\n"
+        last = None
+        last_sent = time.monotonic()
+        deadline = time.monotonic() + PG_EVENT_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            with app.app_context():
+                count = get_event_count()
+            if count != last:
+                last = count
+                last_sent = time.monotonic()
+                yield f"data: {json.dumps({'count': count, 'cap': PG_EVENT_SLOTS})}\n\n"
+                if count >= PG_EVENT_SLOTS:
+                    yield "event: closed\ndata: {}\n\n"
+                    return
+            elif time.monotonic() - last_sent > 15:
+                last_sent = time.monotonic()
+                yield ": ping\n\n"
+            with _event_count_cond:
+                _event_count_cond.wait(timeout=min(5, max(0.1, deadline - time.monotonic())))
+
+    resp = Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    resp.call_on_close(_event_stream_slots.release)
     return resp
 
 
@@ -5452,14 +8431,16 @@ def profitguard_event_apply():
 
         return jsonify({"ok": False, "error": "이메일을 올바르게 입력해주세요."})
 
-    if EventTrialApply.query.count() >= 100:
-
-        return jsonify({"ok": False, "error": "무료체험이 마감되었습니다."})
-
     if EventTrialApply.query.filter_by(email=email).first():
 
         return jsonify({"ok": False, "error": "이미 신청하셨습니다."})
 
+    if not claim_event_slot():
+
+        db.session.rollback()
+
+        return jsonify({"ok": False, "error": "무료체험이 마감되었습니다."})
+
     db.session.add(EventTrialApply(email=email))
 
     user = User.query.filter_by(email=email).first()
@@ -5468,7 +8449,7 @@ def profitguard_event_apply():
 
     if not user:
 
-        user = User(email=email, pw_hash=generate_password_hash(temp_pw))
+        user = User(email=email, pw_hash=hash_password(temp_pw))
 
         db.session.add(user)
 
@@ -5484,8 +8465,6 @@ def profitguard_event_apply():
 
         db.session.add(Subscription(user_id=user.id, plan_type="profitguard_pro", status="active", price=0, expires_at=datetime.utcnow() + timedelta(days=14)))
 
-    db.session.commit()
-
     dl = "https://moneying.biz/profitguard"
 
     if temp_pw:
@@ -5496,21 +8475,28 @@ def profitguard_event_apply():
 
         html = '<div style="font-family:sans-serif;max-width:500px;margin:0 auto;padding:20px;"><h2 style="color:#c4ff00;background:#0a0a0a;padding:20px;border-radius:12px;text-align:center;">PROFIT GUARD 무료체험</h2><p>프로핏가드 14일 무료체험 신청이 완료되었습니다.</p><div style="background:#f5f5f5;padding:16px;border-radius:8px;margin:16px 0;"><p><strong>이메일:</strong> ' + email + '</p><p><strong>비밀번호:</strong> 기존 MONEYING 비밀번호 사용</p><p><strong>체험 기간:</strong> 14일</p></div><p>아래에서 프로핏가드를 다운로드하고 로그인하세요.</p><p style="text-align:center;margin:24px 0;"><a href="' + dl + '" style="background:#c4ff00;color:#000;padding:12px 32px;border-radius:8px;text-decoration:none;font-weight:bold;">프로핏가드 다운로드</a></p></div>'
 
+    # 안내 메일은 아웃박스에 적재 → 신청 트랜잭션과 함께 커밋
+    queue_email(email, "[MONEYING] 프로핏가드 14일 무료체험 안내", html, sensitive=bool(temp_pw))
+
     try:
 
-        send_email(email, "[MONEYING] 프로핏가드 14일 무료체험 안내", html)
+        db.session.commit()
 
-    except Exception as e:
+    except IntegrityError:
 
-        print(f"[EVENT] 이메일 발송 실패: {e}")
+        # 같은 이메일 동시 신청: 슬롯 선점도 함께 롤백됨
+
+        db.session.rollback()
+
+        return jsonify({"ok": False, "error": "이미 신청하셨습니다."})
 
-    return jsonify({"ok": True, "count": EventTrialApply.query.count()})
+    return jsonify({"ok": True, "count": publish_event_count()})
 
 
 
 @app.route("/profitguard-event")
 def profitguard_event():
-    return render_template("profitguard_event.html", is_logged_in=bool(session.get("user_id")))
+    return render_template("profitguard_event.html", is_logged_in=bool(session.get("user_id")), event_slots=PG_EVENT_SLOTS)
 
 # --- onboarding quest ---
 @app.route("/api/onboarding/status")
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# app 모듈은 import 시점에 DB/캐시를 초기화하므로 임시 SQLite DB와 프로세스 내부 캐시로 고정
+_tmp = tempfile.mkdtemp(prefix="moneying-test-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_tmp, "test.db")
+os.environ["OUTBOX_ENABLED"] = "0"
+os.environ["CACHE_BACKEND"] = "simple"
+os.environ.pop("REDIS_URL", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+from flask_caching import Cache
+
+import app as m
+
+
+@pytest.fixture
+def sqlite_cache(tmp_path):
+    return m.SQLiteCache(str(tmp_path / "cache.sqlite3"))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """SQLiteCache 만료 판정에 쓰는 time.time()을 고정/이동"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(m.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=["simple", "sqlite"])
+def shared_cache(request, tmp_path, monkeypatch):
+    """cache_incr가 쓰는 전역 cache/CACHE_BACKEND를 백엔드별로 교체"""
+    config = {"CACHE_TYPE": "SimpleCache", "CACHE_DEFAULT_TIMEOUT": 300, "CACHE_IGNORE_ERRORS": True}
+    if request.param == "sqlite":
+        config.update(CACHE_TYPE="app.SQLiteCache", CACHE_SQLITE_PATH=str(tmp_path / "shared.sqlite3"))
+    cache = Cache(m.app, config=config)
+    monkeypatch.setattr(m, "cache", cache)
+    monkeypatch.setattr(m, "CACHE_BACKEND", request.param)
+    return cache
+
+
+def test_sqlite_cache_roundtrip(sqlite_cache):
+    sqlite_cache.set("n", 3)
+    sqlite_cache.set("obj", {"a": [1, 2]})
+    assert sqlite_cache.get("n") == 3
+    assert sqlite_cache.get("obj") == {"a": [1, 2]}
+    assert sqlite_cache.get("missing") is None
+
+
+def test_sqlite_cache_ttl(sqlite_cache, clock):
+    sqlite_cache.set("k", "v", timeout=10)
+    sqlite_cache.set("forever", "v", timeout=0)
+    clock[0] += 9
+    assert sqlite_cache.get("k") == "v"
+    clock[0] += 2
+    assert sqlite_cache.get("k") is None
+    assert not sqlite_cache.has("k")
+    assert sqlite_cache.get("forever") == "v"
+
+
+def test_sqlite_cache_add_only_when_absent_or_expired(sqlite_cache, clock):
+    assert sqlite_cache.add("k", 1, timeout=10)
+    assert not sqlite_cache.add("k", 2, timeout=10)
+    assert sqlite_cache.get("k") == 1
+    clock[0] += 11
+    assert sqlite_cache.add("k", 3, timeout=10)
+    assert sqlite_cache.get("k") == 3
+
+
+def test_sqlite_cache_inc_resets_after_expiry(sqlite_cache, clock):
+    sqlite_cache.add("c", 0, timeout=10)
+    assert sqlite_cache.inc("c") == 1
+    assert sqlite_cache.inc("c", 4) == 5
+    clock[0] += 11
+    assert sqlite_cache.inc("c") == 1
+
+
+def test_sqlite_cache_inc_is_atomic_across_threads(sqlite_cache):
+    def worker():
+        for _ in range(50):
+            sqlite_cache.inc("hits")
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sqlite_cache.get("hits") == 400
+
+
+def test_sqlite_cache_delete_many_skips_missing(sqlite_cache):
+    for i in range(3):
+        sqlite_cache.set(f"k{i}", i)
+    sqlite_cache.delete_many("missing", "k0", "k2")
+    assert sqlite_cache.get("k0") is None
+    assert sqlite_cache.get("k1") == 1
+    assert sqlite_cache.get("k2") is None
+
+
+def test_delete_many_continues_past_missing_keys(shared_cache):
+    shared_cache.set("a", 1)
+    shared_cache.set("b", 2)
+    shared_cache.delete_many("missing", "a", "b")
+    assert shared_cache.get("a") is None
+    assert shared_cache.get("b") is None
+
+
+def test_cache_incr_counts(shared_cache):
+    assert [m.cache_incr("rl:x", 60) for _ in range(3)] == [1, 2, 3]
+    assert m.cache_incr("rl:y", 60) == 1
+
+
+def test_cache_incr_is_consistent_across_threads(shared_cache):
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(25):
+            value = m.cache_incr("rl:threads", 60)
+            with lock:
+                results.append(value)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results) == list(range(1, 201))